@@ -1,11 +1,30 @@
 import os
 import re
+import sys
 import io
 import html
+import csv
+import gzip
 import json
+import time
+import atexit
+import signal
+import sqlite3
+import threading
+import cProfile
+import functools
+import heapq
+import bisect
+import hashlib
+import random
 import base64
-from datetime import datetime
-from typing import Dict, Any, List, Tuple, Optional
+import asyncio
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Any, List, Tuple, Optional, NamedTuple
+from urllib.parse import urlsplit, unquote
 
 from dotenv import load_dotenv
 
@@ -19,25 +38,38 @@ from telegram import (
     InlineKeyboardMarkup,
     InlineKeyboardButton,
     InputFile,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
 )
 from telegram.ext import (
     ApplicationBuilder,
+    BasePersistence,
+    PersistenceInput,
     CommandHandler,
     MessageHandler,
     ConversationHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
+    TypeHandler,
     ContextTypes,
     filters,
 )
+from telegram.error import BadRequest
 
 # ---------------- ENV ----------------
 BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
 if not BOT_TOKEN:
     raise SystemExit("Missing BOT_TOKEN in .env")
 
-ADMIN_USERNAMES = {
-    u.strip().lower() for u in os.getenv("ADMIN_USERNAMES", "").split(",") if u.strip()
-}
+
+def _parse_admins(raw: str) -> set:
+    return {u.strip().lower() for u in raw.split(",") if u.strip()}
+
+
+ADMIN_USERNAMES = _parse_admins(os.getenv("ADMIN_USERNAMES", ""))
+
+# MULTI_BOT=1 also runs BOT_TOKEN1, BOT_TOKEN2, ... in this process
+MULTI_BOT = os.getenv("MULTI_BOT", "0").strip().lower() in ("1", "true", "yes")
 
 FOLLOW_LINKS = {
     "Telegram": os.getenv("SOCIAL_TELEGRAM", "https://t.me/"),
@@ -52,24 +84,396 @@ SERVICE_JSON = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON", "").strip()
 if SERVICE_JSON and not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
     os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = SERVICE_JSON
 
+# Google calls: consecutive failures that open a breaker, and how long it stays open
+GOOGLE_BREAKER_FAILURES = int(os.getenv("GOOGLE_BREAKER_FAILURES", "5"))
+GOOGLE_BREAKER_RESET_SECS = float(os.getenv("GOOGLE_BREAKER_RESET_SECS", "30"))
+GOOGLE_BACKOFF_BASE = float(os.getenv("GOOGLE_BACKOFF_BASE", "0.5"))
+GOOGLE_BACKOFF_MAX = float(os.getenv("GOOGLE_BACKOFF_MAX", "8"))
+
 GSHEET_ID = os.getenv("GSHEET_ID", "").strip()
-GDRIVE_DOC_ID = os.getenv("GDRIVE_DOC_ID", "").strip()
+GDRIVE_DOC_ID = os.getenv("GDRIVE_DOC_ID", "").strip()  # transcript index doc
+DEMOS_PAGE_SIZE = int(os.getenv("DEMOS_PAGE_SIZE", "6"))  # link buttons per page
+# hot-reloadable overrides for the values above (see Config below)
+CONFIG_FILE = os.getenv("CONFIG_FILE", "config.json")
+CONFIG_WATCH_SECS = float(os.getenv("CONFIG_WATCH_SECS", "10"))
+# idle sessions lose their pad and conversation state after this long
+SESSION_IDLE_SECS = float(os.getenv("SESSION_IDLE_SECS", "1800"))
+# total pad + payload bytes kept for all users before LRU eviction
+SESSION_MEMORY_CAP = int(os.getenv("SESSION_MEMORY_CAP", str(64 * 1024 * 1024)))
+GDRIVE_FOLDER_ID = os.getenv("GDRIVE_FOLDER_ID", "").strip()  # optional, new docs go here
+DOC_BATCH_SIZE = int(os.getenv("DOC_BATCH_SIZE", "10"))
+DOC_FLUSH_SECS = float(os.getenv("DOC_FLUSH_SECS", "30"))
+DOC_ROLLOVER_CHARS = int(os.getenv("DOC_ROLLOVER_CHARS", "500000"))
+DOC_INDEX_FILE = os.getenv("DOC_INDEX_FILE", "doc_index.json")
+LOG_KEEP_MONTHS = int(os.getenv("LOG_KEEP_MONTHS", "3"))  # partitions kept in Sheets
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "log_archive")
+LOG_ARCHIVE_CHECK_SECS = float(os.getenv("LOG_ARCHIVE_CHECK_SECS", "3600"))
+
+# shared state for multi-process workers: "sqlite:<path>", "memory" or "none"
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite:metabot_state.db").strip()
+STATE_FLUSH_SECS = float(os.getenv("STATE_FLUSH_SECS", "5"))
+# webhook mode (instead of polling), e.g. behind a router in front of N workers
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+
+# profiling: PROFILE=sample|trace profiles from boot, /profile toggles it live
+PROFILE_MODE = os.getenv("PROFILE", "").strip().lower()
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# usage counters are flushed to STATE_BACKEND this often; day buckets kept this long
+ANALYTICS_FLUSH_SECS = float(os.getenv("ANALYTICS_FLUSH_SECS", "30"))
+ANALYTICS_KEEP_DAYS = int(os.getenv("ANALYTICS_KEEP_DAYS", "90"))
+
+# demo link health checks (0 interval disables the background job)
+DEMO_HEALTH_INTERVAL = float(os.getenv("DEMO_HEALTH_INTERVAL", "1800"))
+DEMO_HEALTH_TTL = float(os.getenv("DEMO_HEALTH_TTL", "3600"))
+DEMO_HEALTH_CONCURRENCY = int(os.getenv("DEMO_HEALTH_CONCURRENCY", "10"))
+DEMO_HEALTH_PER_HOST = int(os.getenv("DEMO_HEALTH_PER_HOST", "2"))
+DEMO_HEALTH_TIMEOUT = float(os.getenv("DEMO_HEALTH_TIMEOUT", "10"))
+DEMO_HIDE_BROKEN = os.getenv("DEMO_HIDE_BROKEN", "0").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# built-in landing page hosting (LP_HOST_PORT=0 keeps it off)
+LP_HOST_PORT = int(os.getenv("LP_HOST_PORT", "0"))
+LP_HOST_BIND = os.getenv("LP_HOST_BIND", "0.0.0.0")
+LP_PUBLIC_URL = os.getenv("LP_PUBLIC_URL", "").strip()  # e.g. https://pages.example.com
+LP_HOST_DIR = os.getenv("LP_HOST_DIR", "sites")
+LP_HOT_SET_BYTES = int(os.getenv("LP_HOT_SET_BYTES", str(32 * 1024 * 1024)))
+LP_CACHE_MAX_AGE = int(os.getenv("LP_CACHE_MAX_AGE", "300"))
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "2"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "256"))
+AI_EDIT_INTERVAL = 1.0  # seconds between streamed message edits
+
+# content hash -> Telegram file_id, so identical uploads are resent by id
+FILE_ID_CACHE_SIZE = int(os.getenv("FILE_ID_CACHE_SIZE", "1000"))
+
+
+# ---------------- UI (Reply Keyboard) ----------------
+def _build_main_kb() -> ReplyKeyboardMarkup:
+    return ReplyKeyboardMarkup(
+        [
+            [KeyboardButton("🔄 Start")],
+            [
+                KeyboardButton("🖼️ Create a Post"),
+                KeyboardButton("🌐 Create a Landing Page"),
+            ],
+            [KeyboardButton("🧪 Service Demos"), KeyboardButton("🌟 Follow Us")],
+            [KeyboardButton("⛔ Cancel")],
+        ],
+        resize_keyboard=True,
+        one_time_keyboard=False,
+        is_persistent=True,
+    )
+
+
+def _build_follow_kb(links: Dict[str, str]) -> InlineKeyboardMarkup:
+    rows, row = [], []
+    for name, url in links.items():
+        row.append(InlineKeyboardButton(f"⭐ {name}", url=url))
+        if len(row) == 2:
+            rows.append(row)
+            row = []
+    if row:
+        rows.append(row)
+    return InlineKeyboardMarkup(rows)
+
+
+# ---------------- Config (hot reload) ----------------
+class Config(NamedTuple):
+    """Immutable snapshot of the runtime-tunable settings.
+
+    Handlers read the module-level CONFIG once per call; reload_config
+    builds a new snapshot (including the keyboards) and swaps the global,
+    so readers never see a half-applied change and need no lock.
+    """
+
+    admin_usernames: frozenset
+    follow_links: Dict[str, str]
+    demos_page_size: int
+    gsheet_id: str
+    gdrive_doc_id: str
+    main_kb: ReplyKeyboardMarkup
+    follow_kb: InlineKeyboardMarkup
+
+
+def _read_config_file(path: str) -> Dict[str, Any]:
+    """JSON overrides, e.g. {"admin_usernames": "a,b", "demos_page_size": 8,
+    "follow_links": {"Telegram": "https://t.me/x"}, "gsheet_id": "..."}"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} must contain a JSON object")
+    return data
+
+
+def build_config(overrides: Dict[str, Any]) -> Config:
+    admins = overrides.get("admin_usernames")
+    if admins is None:
+        admins = ADMIN_USERNAMES
+    elif isinstance(admins, str):
+        admins = _parse_admins(admins)
+    else:
+        admins = {str(a).strip().lower() for a in admins if str(a).strip()}
+    links = dict(FOLLOW_LINKS)
+    links.update(overrides.get("follow_links") or {})
+    page_size = max(1, int(overrides.get("demos_page_size", DEMOS_PAGE_SIZE)))
+    return Config(
+        admin_usernames=frozenset(admins),
+        follow_links=links,
+        demos_page_size=page_size,
+        gsheet_id=str(overrides.get("gsheet_id", GSHEET_ID)).strip(),
+        gdrive_doc_id=str(overrides.get("gdrive_doc_id", GDRIVE_DOC_ID)).strip(),
+        main_kb=_build_main_kb(),
+        follow_kb=_build_follow_kb(links),
+    )
+
+
+def _config_mtime() -> float:
+    try:
+        return os.path.getmtime(CONFIG_FILE)
+    except OSError:
+        return 0.0
+
+
+try:
+    CONFIG = build_config(_read_config_file(CONFIG_FILE))
+except Exception as e:
+    print("[WARN] config file ignored:", e)
+    CONFIG = build_config({})
+_CONFIG_MTIME = _config_mtime()
+
+
+# ---------------- Google API resilience ----------------
+class GoogleUnavailable(Exception):
+    """Raised instead of calling Google while a service's breaker is open."""
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures -> half-open.
+
+    While open every call is refused without touching the network. After
+    `reset_secs` one probe call is let through (half-open): success closes
+    the breaker, failure opens it for another `reset_secs`.
+    """
+
+    def __init__(self, name: str, threshold: int, reset_secs: float):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.reset_secs = reset_secs
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = Counter()  # calls, failures, retries, rejected, opened
+        self.last_error = ""
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_secs:
+                    self.stats["rejected"] += 1
+                    return False
+                self.state = "half-open"
+            if self.state == "half-open":
+                if self._probing:
+                    self.stats["rejected"] += 1
+                    return False
+                self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != "closed":
+                print(f"[INFO] Google {self.name} recovered, breaker closed")
+            self.state = "closed"
+
+    def release(self):
+        """End a call that proved nothing either way (e.g. a local bug)."""
+        with self._lock:
+            self._probing = False
+
+    def failure(self, error: Exception):
+        with self._lock:
+            self.stats["failures"] += 1
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+            self._failures += 1
+            self._probing = False
+            if self.state == "half-open" or self._failures >= self.threshold:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                    print(f"[WARN] Google {self.name} breaker open:", self.last_error)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+# endpoint -> (timeout seconds, attempts)
+# Timeouts are never retried: the abandoned call still holds the service's
+# worker thread, so a retry would only queue behind it and time out too.
+# delete_rows gets one attempt (row numbers shift once it succeeds).
+GOOGLE_ENDPOINTS: Dict[str, Tuple[float, int]] = {
+    "sheets.open": (15, 3),
+    "sheets.worksheet": (10, 3),
+    "sheets.worksheets": (10, 3),
+    "sheets.add_worksheet": (10, 2),
+    "sheets.del_worksheet": (10, 2),
+    "sheets.update": (10, 3),
+    "sheets.get_all_values": (15, 3),
+    "sheets.append_row": (5, 2),  # per update, keep it short
+    "sheets.findall": (10, 3),
+    "sheets.row_values": (10, 3),
+    "sheets.delete_rows": (10, 1),
+    "docs.create": (10, 2),
+    "docs.batchUpdate": (10, 2),
+    "drive.create": (10, 2),
+}
+GOOGLE_RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _google_status(e: Exception) -> Optional[int]:
+    code = getattr(e, "code", None)  # gspread APIError
+    if isinstance(code, int):
+        return code
+    status = getattr(getattr(e, "resp", None), "status", None)  # HttpError
+    return int(status) if status else None
+
+
+def _transport_errors() -> Tuple[type, ...]:
+    """Errors meaning Google could not be reached (not that it said no)."""
+    errors: List[type] = [OSError]  # sockets, timeouts, requests errors
+    try:
+        import httplib2
+
+        errors.append(httplib2.HttpLib2Error)  # e.g. ServerNotFoundError
+    except ImportError:
+        pass
+    try:
+        from google.auth import exceptions as auth_exceptions
+
+        # token refresh failing mid-outage
+        errors += [auth_exceptions.TransportError, auth_exceptions.RefreshError]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+GOOGLE_TRANSPORT_ERRORS = _transport_errors()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class GoogleGuard:
+    """Timeouts, retries with jittered backoff and a breaker per Google service.
+
+    Calls run on one worker thread per service (the Docs/Drive clients are
+    not thread-safe) and are abandoned after the endpoint timeout.
+    call() blocks, so callers belong on a worker thread (log writes go
+    through _LOG_WRITER, handlers use asyncio.to_thread). Called on the
+    event loop anyway, it makes a single attempt and never sleeps there.
+    Transport errors (GOOGLE_TRANSPORT_ERRORS), timeouts and 408/429/5xx
+    count as failures. Other API errors (e.g. 404) mean Google answered
+    and pass straight through; anything else leaves the breaker as it is.
+    """
+
+    def __init__(self):
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+
+    def _breaker(self, service: str) -> CircuitBreaker:
+        if service not in self.breakers:
+            self.breakers[service] = CircuitBreaker(
+                service, GOOGLE_BREAKER_FAILURES, GOOGLE_BREAKER_RESET_SECS
+            )
+            self._pools[service] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"google-{service}"
+            )
+        return self.breakers[service]
+
+    def call(self, endpoint: str, fn, *args, **kwargs):
+        service = endpoint.partition(".")[0]
+        breaker = self._breaker(service)
+        timeout, attempts = GOOGLE_ENDPOINTS.get(endpoint, (10, 2))
+        if _on_event_loop():
+            attempts = 1  # a backoff sleep here would stall every bot
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise GoogleUnavailable(f"Google {service} unavailable (breaker open)")
+            breaker.stats["calls"] += 1
+            try:
+                future = self._pools[service].submit(fn, *args, **kwargs)
+                result = future.result(timeout=timeout)
+            except TimeoutError:
+                future.cancel()
+                err = TimeoutError(f"{endpoint} timed out after {timeout:g}s")
+                retryable = False
+            except Exception as e:
+                status = _google_status(e)
+                if status is not None and status not in GOOGLE_RETRY_STATUS:
+                    breaker.success()  # Google answered, the request was wrong
+                    raise
+                if status is None and not isinstance(e, GOOGLE_TRANSPORT_ERRORS):
+                    breaker.release()  # unknown: neither proof of health nor outage
+                    raise
+                err, retryable = e, True
+            else:
+                breaker.success()
+                return result
+            breaker.failure(err)
+            if not retryable or attempt == attempts - 1:
+                raise err
+            breaker.stats["retries"] += 1
+            delay = min(GOOGLE_BACKOFF_MAX, GOOGLE_BACKOFF_BASE * 2**attempt)
+            time.sleep(random.uniform(0, delay))  # full jitter, off the loop
+
+    def report(self) -> List[Dict[str, Any]]:
+        return [
+            {"service": b.name, "state": b.state, "last_error": b.last_error, **b.stats}
+            for b in self.breakers.values()
+        ]
+
+
+GOOGLE_GUARD = GoogleGuard()
+google_call = GOOGLE_GUARD.call
+
 
 # ---------------- Google APIs (Docs + Sheets) ----------------
-SHEETS_WS = None  # sheet1 for logs
+SHEETS_BOOK = None  # spreadsheet handle, log partitions are created on it
+SHEETS_WS = None  # sheet1, fallback for logs if a partition can't be created
 SHEETS_DEMOS_WS = None  # ServiceDemos worksheet
 service_docs = None
+service_drive = None  # only used to place new transcript docs in GDRIVE_FOLDER_ID
 
 
 def _try_init_google():
     """Initialize gspread, Sheets + Docs. Create ServiceDemos worksheet if possible."""
-    global SHEETS_WS, SHEETS_DEMOS_WS, service_docs
+    global SHEETS_BOOK, SHEETS_WS, SHEETS_DEMOS_WS, service_docs, service_drive
+    SHEETS_BOOK = SHEETS_WS = SHEETS_DEMOS_WS = service_docs = service_drive = None
     if not SERVICE_JSON:
         return
+    cfg = CONFIG
 
     try:
         import gspread
+        import httplib2
         from google.oauth2.service_account import Credentials
+        from google_auth_httplib2 import AuthorizedHttp
         from googleapiclient.discovery import build
 
         scopes = [
@@ -80,9 +484,13 @@ def _try_init_google():
         ]
         creds = Credentials.from_service_account_file(SERVICE_JSON, scopes=scopes)
         gc = gspread.authorize(creds)
+        # socket-level backstop for calls GoogleGuard has given up waiting on
+        backstop = max(t for t, _ in GOOGLE_ENDPOINTS.values()) * 2
+        gc.set_timeout(backstop)
 
-        if GSHEET_ID:
-            sheet = gc.open_by_key(GSHEET_ID)
+        if cfg.gsheet_id:
+            sheet = google_call("sheets.open", gc.open_by_key, cfg.gsheet_id)
+            SHEETS_BOOK = sheet
             # logs: first sheet
             try:
                 SHEETS_WS = sheet.sheet1
@@ -91,18 +499,38 @@ def _try_init_google():
 
             # demos: ensure worksheet exists
             try:
-                SHEETS_DEMOS_WS = sheet.worksheet("ServiceDemos")
+                SHEETS_DEMOS_WS = google_call(
+                    "sheets.worksheet", sheet.worksheet, "ServiceDemos"
+                )
             except Exception:
                 try:
-                    SHEETS_DEMOS_WS = sheet.add_worksheet(
-                        title="ServiceDemos", rows=1000, cols=4
+                    SHEETS_DEMOS_WS = google_call(
+                        "sheets.add_worksheet",
+                        sheet.add_worksheet,
+                        title="ServiceDemos",
+                        rows=1000,
+                        cols=4,
+                    )
+                    google_call(
+                        "sheets.update",
+                        SHEETS_DEMOS_WS.update,
+                        [["Name", "URL", "Category", "Order"]],
                     )
-                    SHEETS_DEMOS_WS.update([["Name", "URL", "Category", "Order"]])
                 except Exception:
                     SHEETS_DEMOS_WS = None
 
-        if GDRIVE_DOC_ID:
-            service_docs = build("docs", "v1", credentials=creds)
+        if cfg.gdrive_doc_id:
+            service_docs = build(
+                "docs",
+                "v1",
+                http=AuthorizedHttp(creds, http=httplib2.Http(timeout=backstop)),
+            )
+            if GDRIVE_FOLDER_ID:
+                service_drive = build(
+                    "drive",
+                    "v3",
+                    http=AuthorizedHttp(creds, http=httplib2.Http(timeout=backstop)),
+                )
     except Exception as e:
         print("[WARN] Google APIs init issue:", e)
 
@@ -110,49 +538,919 @@ def _try_init_google():
 _try_init_google()
 
 
+# ---------------- Shared state ----------------
+class KVStore:
+    """Namespaced string key/value store shared by every worker process.
+
+    SQLiteKV is the single-host default. To use a networked store, subclass
+    this and register it with register_kv_backend("scheme", factory), then
+    set STATE_BACKEND=scheme:<address>.
+    """
+
+    def get(self, ns: str, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, ns: str, key: str, value: str):
+        raise NotImplementedError
+
+    def delete(self, ns: str, key: str):
+        raise NotImplementedError
+
+    def items(self, ns: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def incr(self, ns: str, key: str, amount: int = 1) -> int:
+        """Atomically add `amount` to an integer value and return the new value."""
+        raise NotImplementedError
+
+
+class MemoryKV(KVStore):
+    """In-process store; only useful for a single worker or tests."""
+
+    def __init__(self):
+        self._data: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, ns, key):
+        return self._data.get((ns, key))
+
+    def set(self, ns, key, value):
+        self._data[(ns, key)] = value
+
+    def delete(self, ns, key):
+        self._data.pop((ns, key), None)
+
+    def items(self, ns):
+        return {k: v for (n, k), v in list(self._data.items()) if n == ns}
+
+    def incr(self, ns, key, amount=1):
+        with self._lock:
+            value = int(self._data.get((ns, key)) or 0) + amount
+            self._data[(ns, key)] = str(value)
+            return value
+
+
+class SQLiteKV(KVStore):
+    """SQLite in WAL mode: concurrent readers, one writer, safe across processes."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (ns, key))"
+        )
+
+    def get(self, ns, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM kv WHERE ns = ? AND key = ?", (ns, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, ns, key, value):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO kv (ns, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (ns, key) DO UPDATE SET value = excluded.value",
+                (ns, key, value),
+            )
+
+    def delete(self, ns, key):
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+
+    def items(self, ns):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value FROM kv WHERE ns = ?", (ns,)
+            ).fetchall()
+        return dict(rows)
+
+    def incr(self, ns, key, amount=1):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO kv (ns, key, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (ns, key) DO UPDATE "
+                    "SET value = CAST(value AS INTEGER) + ?",
+                    (ns, key, str(amount), amount),
+                )
+                row = self._db.execute(
+                    "SELECT value FROM kv WHERE ns = ? AND key = ?", (ns, key)
+                ).fetchone()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return int(row[0])
+
+
+_KV_BACKENDS: Dict[str, Any] = {
+    "sqlite": SQLiteKV,
+    "memory": lambda _arg: MemoryKV(),
+}
+
+
+def register_kv_backend(scheme: str, factory):
+    """factory(arg) -> KVStore, selected by STATE_BACKEND=scheme:arg."""
+    _KV_BACKENDS[scheme] = factory
+
+
+def make_kv(url: str) -> Optional[KVStore]:
+    if not url or url == "none":
+        return None
+    scheme, _, arg = url.partition(":")
+    factory = _KV_BACKENDS.get(scheme)
+    if factory is None:
+        print(f"[WARN] unknown STATE_BACKEND {url!r}, shared state off")
+        return None
+    try:
+        return factory(arg)
+    except Exception as e:
+        print("[WARN] shared state init issue:", e)
+        return None
+
+
+SHARED_KV = make_kv(STATE_BACKEND)
+
+
+class KVPersistence(BasePersistence):
+    """Keeps user_data (pads) and conversation state in a KVStore.
+
+    Every write bumps a per-user (per-conversation) revision. Before each
+    update, refresh_user_data (run by PTB) and refresh_conversation (run by
+    _sync_conversation) swap in a copy written by another worker only when
+    its revision is newer than ours, and _flush_persistence writes ours
+    back once the update is handled. Any worker can therefore take any
+    user's next update. A stale write (e.g. an idle timeout firing on a
+    worker the user has since left) is dropped rather than clobbering the
+    newer state.
+    """
+
+    def __init__(self, kv: KVStore, prefix: str, update_interval: float = 5):
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False, chat_data=False, user_data=True, callback_data=False
+            ),
+            update_interval=update_interval,
+        )
+        self._kv = kv
+        self._ns_user = f"{prefix}:user_data"
+        self._ns_rev = f"{prefix}:user_rev"
+        self._prefix = prefix
+        self._revs: Dict[int, int] = {}
+        self._written: Dict[int, int] = {}  # user id -> hash of data we hold
+        self._conv_revs: Dict[Tuple[str, str], int] = {}  # (name, key) -> rev
+
+    def _read_user(self, raw: str) -> Tuple[int, Dict[str, Any]]:
+        stored = json.loads(raw)
+        return int(stored.get("rev", 0)), stored.get("data") or {}
+
+    @staticmethod
+    def _digest(data: Dict[str, Any]) -> int:
+        return hash(json.dumps(data, default=str))
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        out = {}
+        for key, raw in self._kv.items(self._ns_user).items():
+            rev, data = self._read_user(raw)
+            self._revs[int(key)] = rev
+            self._written[int(key)] = self._digest(data)
+            out[int(key)] = data
+        return out
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]):
+        # PTB marks the user of every update, inline queries included
+        digest = self._digest(data)
+        if self._written.get(user_id) == digest:
+            return
+        rev = self._kv.incr(self._ns_rev, str(user_id))
+        self._kv.set(
+            self._ns_user,
+            str(user_id),
+            json.dumps({"rev": rev, "data": data}, default=str),
+        )
+        self._revs[user_id] = rev
+        self._written[user_id] = digest
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]):
+        raw = self._kv.get(self._ns_user, str(user_id))
+        if raw is None:
+            return
+        rev, data = self._read_user(raw)
+        if rev > self._revs.get(user_id, 0):
+            user_data.clear()
+            user_data.update(data)
+            self._revs[user_id] = rev
+            self._written[user_id] = self._digest(data)
+
+    async def drop_user_data(self, user_id: int):
+        self._kv.delete(self._ns_user, str(user_id))
+        self._revs.pop(user_id, None)
+        self._written.pop(user_id, None)
+
+    def _conv_rev(self, name: str, k: str) -> int:
+        return int(self._kv.get(f"{self._prefix}:conv_rev:{name}", k) or 0)
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        out = {}
+        for k, raw in self._kv.items(f"{self._prefix}:conv:{name}").items():
+            stored = json.loads(raw)
+            self._conv_revs[(name, k)] = int(stored.get("rev", 0))
+            out[tuple(json.loads(k))] = stored.get("state")
+        return out
+
+    async def update_conversation(self, name: str, key: Tuple, new_state):
+        k = json.dumps(list(key))
+        if self._conv_rev(name, k) > self._conv_revs.get((name, k), 0):
+            return  # another worker moved this conversation on; ours is stale
+        rev = self._kv.incr(f"{self._prefix}:conv_rev:{name}", k)
+        self._conv_revs[(name, k)] = rev
+        ns = f"{self._prefix}:conv:{name}"
+        if new_state is None:
+            self._kv.delete(ns, k)
+        else:
+            self._kv.set(ns, k, json.dumps({"rev": rev, "state": new_state}))
+
+    async def refresh_conversation(self, name: str, key: Tuple) -> Tuple[bool, object]:
+        """(True, state) when another worker has written a newer state."""
+        k = json.dumps(list(key))
+        rev = self._conv_rev(name, k)
+        if rev <= self._conv_revs.get((name, k), 0):
+            return False, None
+        raw = self._kv.get(f"{self._prefix}:conv:{name}", k)
+        self._conv_revs[(name, k)] = rev
+        return True, json.loads(raw).get("state") if raw else None
+
+    def conversation_moved(self, name: str, key: Tuple) -> bool:
+        k = json.dumps(list(key))
+        return self._conv_rev(name, k) > self._conv_revs.get((name, k), 0)
+
+    # bot/chat/callback data stay per process (bot_data holds the bot config)
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        pass  # every write already went to the store
+
+
+async def _adopt_conversation_state(conv: ConversationHandler, key: Tuple, state):
+    """Swap in another worker's state without PTB treating it as our write.
+
+    PTB has no public API for this, so it uses ConversationHandler internals
+    of the pinned python-telegram-bot 21.4 (_timeout_jobs_lock,
+    timeout_jobs and the TrackingDict in _conversations). Re-check it when
+    upgrading.
+    """
+    async with conv._timeout_jobs_lock:  # PTB pops timeout_jobs under it
+        job = conv.timeout_jobs.pop(key, None)
+    if job is not None:
+        job.schedule_removal()  # the other worker's timeout is the live one
+    # write without tracking, or PTB would persist it back as our change
+    if state is None:
+        conv._conversations.data.pop(key, None)
+    else:
+        conv._conversations.update_no_track({key: state})
+
+
+async def _sync_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs first (group -2): adopt conversation state from other workers."""
+    persistence = context.application.persistence
+    conv = context.bot_data.get("conversation")
+    if not isinstance(persistence, KVPersistence) or conv is None:
+        return
+    if not (update.effective_chat and update.effective_user):
+        return
+    key = (update.effective_chat.id, update.effective_user.id)
+    changed, state = await persistence.refresh_conversation(conv.name, key)
+    if changed:
+        await _adopt_conversation_state(conv, key, state)
+
+
+async def _flush_persistence(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs last: write this message's pad and state now, not on the next tick.
+
+    Only messages move the conversation or edit pads. Inline queries and
+    button presses are left to PTB's own tick, where unchanged user_data
+    is skipped.
+    """
+    if update.message is None or update.effective_user is None:
+        return
+    context.application.mark_data_for_update_persistence(
+        user_ids=update.effective_user.id
+    )
+    await context.application.update_persistence()
+
+
+# ---------------- Profiling ----------------
+class HandlerProfiler:
+    """Per-handler timings plus a sampling or deterministic profile window.
+
+    `sample` polls the event loop thread's stack every PROFILE_INTERVAL and
+    emits collapsed stacks (flamegraph.pl / speedscope input), each rooted
+    at the outermost @profiled handler on the stack. `trace` runs cProfile
+    and emits a .pstats file. While inactive, @profiled costs one flag check.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.mode = ""
+        self._handlers: Dict[Any, str] = {}  # code object -> handler name
+        self._timings: Dict[str, List[float]] = {}  # name -> [calls, total, max]
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._cprof: Optional[cProfile.Profile] = None
+        self._started_at = 0.0
+        self._elapsed = 0.0
+        self._auto_stop: Optional[asyncio.TimerHandle] = None
+
+    def register(self, fn):
+        self._handlers[fn.__code__] = fn.__name__
+
+    def record(self, name: str, elapsed: float):
+        t = self._timings.get(name)
+        if t is None:
+            self._timings[name] = [1, elapsed, elapsed]
+        else:
+            t[0] += 1
+            t[1] += elapsed
+            t[2] = max(t[2], elapsed)
+
+    def start(self, mode: str = "sample", seconds: float = 0) -> str:
+        """Start a window; with seconds > 0 (and a running loop) it auto-stops."""
+        if self.active:
+            return f"Already profiling ({self.mode})."
+        if mode not in ("sample", "trace"):
+            return "Mode must be sample or trace."
+        self.mode = mode
+        self._timings = {}
+        self._stacks = Counter()
+        self._cprof = None
+        if mode == "trace":
+            self._cprof = cProfile.Profile()
+            self._cprof.enable()  # profiles the calling (event loop) thread
+        else:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._sample_loop,
+                args=(threading.get_ident(),),
+                name="profiler",
+                daemon=True,
+            )
+            self._thread.start()
+        self._started_at = time.monotonic()
+        self.active = True
+        if seconds > 0:
+            loop = asyncio.get_running_loop()
+            self._auto_stop = loop.call_later(seconds, self.stop)
+            return f"Profiling started ({mode}). Auto-stop in {seconds:g}s."
+        return f"Profiling started ({mode})."
+
+    def stop(self) -> str:
+        if not self.active:
+            return "Profiler is not running."
+        if self._auto_stop is not None:
+            # a manual stop must not leave the timer to cut a later window short
+            self._auto_stop.cancel()
+            self._auto_stop = None
+        self.active = False
+        self._elapsed = time.monotonic() - self._started_at
+        if self._cprof is not None:
+            self._cprof.disable()
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+        return f"Profiling stopped after {self._elapsed:.1f}s."
+
+    def _sample_loop(self, target: int):
+        current_frames = sys._current_frames
+        while not self._stop.wait(PROFILE_INTERVAL):
+            frame = current_frames().get(target)
+            stack, root = [], "(no handler)"
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                root = self._handlers.get(code, root)  # ends on the outermost
+                frame = frame.f_back
+            stack.append(root)
+            stack.reverse()
+            self._stacks[";".join(stack)] += 1
+
+    def summary(self) -> str:
+        if not self._timings:
+            return "No handler calls recorded."
+        lines = ["handler: calls, total ms, avg ms, max ms"]
+        for name, (calls, total, worst) in sorted(
+            self._timings.items(), key=lambda kv: -kv[1][1]
+        ):
+            lines.append(
+                f"{name}: {int(calls)}, {total * 1000:.1f}, "
+                f"{total * 1000 / calls:.1f}, {worst * 1000:.1f}"
+            )
+        return "\n".join(lines)
+
+    def dump(self) -> Optional[str]:
+        """Write the last window's profile; returns the file path."""
+        if self.active:
+            self.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        if self.mode == "trace" and self._cprof is not None:
+            path = os.path.join(PROFILE_DIR, f"profile-{stamp}.pstats")
+            self._cprof.dump_stats(path)
+            return path
+        if self.mode == "sample" and self._stacks:
+            path = os.path.join(PROFILE_DIR, f"profile-{stamp}.folded")
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            return path
+        return None
+
+
+PROFILER = HandlerProfiler()
+
+
+def profiled(fn):
+    """Attribute time spent in `fn` to its name while profiling is on."""
+    PROFILER.register(fn)
+    name = fn.__name__
+
+    if asyncio.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            if not PROFILER.active:
+                return await fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                PROFILER.record(name, time.perf_counter() - t0)
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not PROFILER.active:
+            return fn(*args, **kwargs)
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            PROFILER.record(name, time.perf_counter() - t0)
+
+    return wrapper
+
+
+# ---------------- Docs transcript ----------------
+class DocsTranscript:
+    """Appends log entries at the end of a rotating set of Google Docs.
+
+    Entries are buffered and written with one insertText per batch. A new
+    document is started every day, or once the current one passes
+    DOC_ROLLOVER_CHARS. Created documents are listed (one line each) in the
+    GDRIVE_DOC_ID index document and kept in the shared store when there is
+    one, so every worker writes to the same current document; without one
+    they are kept in DOC_INDEX_FILE.
+    """
+
+    MAX_PENDING = 500  # cap the buffer while Docs is failing
+    KV_NS = "docs_transcript"  # "index" -> {"docs": [...]}
+    CHARS_NS = "docs_transcript:chars"  # doc id -> characters written
+    CLAIM_NS = "docs_transcript:claims"  # "<day>:<part>:<minute>" -> creators
+
+    def __init__(self, index_path: str, kv: Optional[KVStore] = None):
+        self._index_path = index_path
+        self._kv = kv
+        self._docs: List[Dict[str, Any]] = self._load_index()
+        self._pending: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def _load_index(self) -> List[Dict[str, Any]]:
+        try:
+            raw = self._kv.get(self.KV_NS, "index") if self._kv is not None else None
+            if raw is not None:
+                data = json.loads(raw)
+            else:  # no shared index yet: start from the local file
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("docs"), list):
+                return data["docs"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("[WARN] doc index read failed:", e)
+        return []
+
+    def _save_index(self):
+        try:
+            if self._kv is not None:
+                self._kv.set(self.KV_NS, "index", json.dumps({"docs": self._docs}))
+                return
+            tmp = self._index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"docs": self._docs}, f, indent=2)
+            os.replace(tmp, self._index_path)
+        except Exception as e:
+            print("[WARN] doc index write failed:", e)
+
+    def documents(self) -> List[Dict[str, Any]]:
+        return list(self._docs)
+
+    def _chars(self, doc: Dict[str, Any]) -> int:
+        if self._kv is not None:
+            return int(self._kv.get(self.CHARS_NS, doc["id"]) or 0)
+        return doc.get("chars", 0)
+
+    def _add_chars(self, doc: Dict[str, Any], n: int):
+        if self._kv is not None:
+            self._kv.incr(self.CHARS_NS, doc["id"], n)
+            return
+        doc["chars"] = doc.get("chars", 0) + n
+        self._save_index()
+
+    def _current_doc(self, day: str) -> Optional[Dict[str, Any]]:
+        """Today's document, or None while another worker is creating it."""
+        if self._kv is not None:
+            self._docs = self._load_index()  # another worker may have rolled over
+        if self._docs:
+            cur = self._docs[-1]
+            if cur.get("day") == day and self._chars(cur) < DOC_ROLLOVER_CHARS:
+                return cur
+        return self._create_doc(day)
+
+    def _claim(self, day: str, part: int) -> bool:
+        """Let one worker create a document; a claim lapses after a minute."""
+        if self._kv is None:
+            return True
+        minute = int(time.time() // 60)
+        if self._kv.incr(self.CLAIM_NS, f"{day}:{part}:{minute}") != 1:
+            return False
+        for key in self._kv.items(self.CLAIM_NS):
+            if not key.startswith(f"{day}:"):
+                self._kv.delete(self.CLAIM_NS, key)
+        return True
+
+    def _create_doc(self, day: str) -> Optional[Dict[str, Any]]:
+        part = sum(1 for d in self._docs if d.get("day") == day) + 1
+        if not self._claim(day, part):
+            return None
+        title = f"MetaBot transcript {day}" + (f" ({part})" if part > 1 else "")
+        if service_drive and GDRIVE_FOLDER_ID:
+            req = service_drive.files().create(
+                body={
+                    "name": title,
+                    "mimeType": "application/vnd.google-apps.document",
+                    "parents": [GDRIVE_FOLDER_ID],
+                },
+                fields="id",
+            )
+            doc_id = google_call("drive.create", req.execute)["id"]
+        else:
+            req = service_docs.documents().create(body={"title": title})
+            doc_id = google_call("docs.create", req.execute)["documentId"]
+        entry = {"id": doc_id, "title": title, "day": day, "part": part, "chars": 0}
+        if self._kv is not None:
+            self._docs = self._load_index()
+        self._docs.append(entry)
+        self._save_index()
+        # index doc stays tiny: one line per transcript document
+        try:
+            self._append(
+                CONFIG.gdrive_doc_id,
+                f"{title}: https://docs.google.com/document/d/{doc_id}/edit\n",
+            )
+        except Exception as e:
+            print("[WARN] Doc index append failed:", e)
+        return entry
+
+    def _append(self, doc_id: str, text: str):
+        body = {
+            "requests": [
+                {"insertText": {"endOfSegmentLocation": {}, "text": text}}
+            ]
+        }
+        req = service_docs.documents().batchUpdate(documentId=doc_id, body=body)
+        google_call("docs.batchUpdate", req.execute)
+
+    def add(self, text: str):
+        self._pending.append(text)
+        if (
+            len(self._pending) >= DOC_BATCH_SIZE
+            or time.monotonic() - self._last_flush >= DOC_FLUSH_SECS
+        ):
+            self.flush()
+
+    def flush(self):
+        if not self._pending or not (service_docs and CONFIG.gdrive_doc_id):
+            return
+        self._last_flush = time.monotonic()
+        text = "".join(self._pending)
+        try:
+            cur = self._current_doc(datetime.now().strftime("%Y-%m-%d"))
+            if cur is None:
+                return  # keep the batch for the next flush
+            self._append(cur["id"], text)
+        except Exception as e:
+            print("[WARN] Doc log failed:", e)
+            del self._pending[: -self.MAX_PENDING]
+            return
+        self._pending.clear()
+        try:
+            self._add_chars(cur, len(text))
+        except Exception as e:
+            print("[WARN] doc size update failed:", e)
+
+
+DOCS_TRANSCRIPT = DocsTranscript(DOC_INDEX_FILE, SHARED_KV)  # see _post_shutdown
+
+
+# ---------------- Sheets log partitions ----------------
+LOG_HEADER = ["Timestamp", "User", "Message", "Reply"]
+LOG_PARTITION_RE = re.compile(r"^Logs-(\d{4})-(\d{2})$")
+_LOG_PARTITIONS: Dict[str, Any] = {}  # worksheet title -> cached handle
+
+
+def _log_partition_title(now: datetime) -> str:
+    return now.strftime("Logs-%Y-%m")
+
+
+def _log_worksheet(now: datetime):
+    """Return this month's log worksheet, creating it on first use."""
+    title = _log_partition_title(now)
+    ws = _LOG_PARTITIONS.get(title)
+    if ws is not None:
+        return ws
+    if not SHEETS_BOOK:
+        return SHEETS_WS
+    try:
+        ws = google_call("sheets.worksheet", SHEETS_BOOK.worksheet, title)
+    except GoogleUnavailable:
+        return SHEETS_WS
+    except Exception:
+        try:
+            ws = google_call(
+                "sheets.add_worksheet",
+                SHEETS_BOOK.add_worksheet,
+                title=title,
+                rows=1000,
+                cols=4,
+            )
+            google_call("sheets.update", ws.update, [LOG_HEADER])
+        except Exception as e:
+            print("[WARN] log partition create failed:", e)
+            return SHEETS_WS
+    _LOG_PARTITIONS[title] = ws
+    return ws
+
+
+def archive_log_partitions(now: Optional[datetime] = None) -> List[str]:
+    """Export partitions older than LOG_KEEP_MONTHS to gzip CSV and delete them.
+
+    Returns the archive file paths written.
+    """
+    if not SHEETS_BOOK:
+        return []
+    now = now or datetime.now()
+    current = now.year * 12 + now.month - 1
+    written = []
+    try:
+        worksheets = google_call("sheets.worksheets", SHEETS_BOOK.worksheets)
+    except Exception as e:
+        print("[WARN] list worksheets failed:", e)
+        return []
+    for ws in worksheets:
+        m = LOG_PARTITION_RE.match(ws.title)
+        if not m:
+            continue
+        month = int(m.group(1)) * 12 + int(m.group(2)) - 1
+        if current - month < LOG_KEEP_MONTHS:
+            continue
+        try:
+            rows = google_call("sheets.get_all_values", ws.get_all_values)
+            os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+            path = os.path.join(LOG_ARCHIVE_DIR, f"{ws.title}.csv.gz")
+            with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+                csv.writer(f).writerows(rows)
+            google_call("sheets.del_worksheet", SHEETS_BOOK.del_worksheet, ws)
+            _LOG_PARTITIONS.pop(ws.title, None)
+            written.append(path)
+        except Exception as e:
+            print(f"[WARN] archive {ws.title} failed:", e)
+    return written
+
+
 # ---------------- Logging to Google ----------------
-def log_to_google(user: str, message: str, reply: str):
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    # Sheet (logs)
+# One thread owns the Sheets log and the Docs transcript: handlers only
+# enqueue, so Google latency (timeouts, backoff) never reaches the loop.
+_LOG_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="google-log")
+
+
+def _write_log(now: datetime, user: str, message: str, reply: str):
+    ts = now.strftime("%Y-%m-%d %H:%M:%S")
+    # Sheet (logs, one worksheet per month)
     try:
-        if SHEETS_WS:
-            SHEETS_WS.append_row(
-                [ts, user, message, reply], value_input_option="USER_ENTERED"
+        ws = _log_worksheet(now)
+        if ws:
+            google_call(
+                "sheets.append_row",
+                ws.append_row,
+                [ts, user, message, reply],
+                value_input_option="USER_ENTERED",
             )
     except Exception as e:
         print("[WARN] Sheet log failed:", e)
-    # Doc
+    # Doc (buffered, appended at the end of today's transcript)
+    if service_docs and CONFIG.gdrive_doc_id:
+        DOCS_TRANSCRIPT.add(f"[{ts}] {user}\nUser: {message}\nBot: {reply}\n\n")
+
+
+@profiled
+def log_to_google(user: str, message: str, reply: str):
     try:
-        if service_docs and GDRIVE_DOC_ID:
-            body = {
-                "requests": [
-                    {
-                        "insertText": {
-                            "location": {"index": 1},
-                            "text": f"[{ts}] {user}\nUser: {message}\nBot: {reply}\n\n",
-                        }
-                    }
-                ]
-            }
-            service_docs.documents().batchUpdate(
-                documentId=GDRIVE_DOC_ID, body=body
-            ).execute()
+        _LOG_WRITER.submit(_write_log, datetime.now(), user, message, reply)
+    except RuntimeError as e:  # interpreter shutting down
+        print("[WARN] log dropped:", e)
+
+
+async def _docs_flush_loop():
+    """Bound transcript latency by DOC_FLUSH_SECS even with sparse traffic."""
+    while True:
+        await asyncio.sleep(DOC_FLUSH_SECS)
+        await asyncio.wrap_future(_LOG_WRITER.submit(DOCS_TRANSCRIPT.flush))
+
+
+_ARCHIVED_DAY = ""  # last day this process archived (no shared store)
+
+
+def _claim_log_archive() -> bool:
+    """True for the first worker to ask on a given day."""
+    global _ARCHIVED_DAY
+    today = date.today().isoformat()
+    if SHARED_KV is None:
+        claimed, _ARCHIVED_DAY = _ARCHIVED_DAY != today, today
+        return claimed
+    try:
+        if SHARED_KV.incr("log_archive", today) != 1:
+            return False
+        for day in SHARED_KV.items("log_archive"):
+            if day != today:
+                SHARED_KV.delete("log_archive", day)
+        return True
     except Exception as e:
-        print("[WARN] Doc log failed:", e)
+        print("[WARN] log archive claim failed:", e)
+        return False
 
 
-# ---------------- UI (Reply Keyboard) ----------------
-MAIN_KB = ReplyKeyboardMarkup(
-    [
-        [KeyboardButton("🔄 Start")],
-        [KeyboardButton("🖼️ Create a Post"), KeyboardButton("🌐 Create a Landing Page")],
-        [KeyboardButton("🧪 Service Demos"), KeyboardButton("🌟 Follow Us")],
-        [KeyboardButton("⛔ Cancel")],
-    ],
-    resize_keyboard=True,
-    one_time_keyboard=False,
-    is_persistent=True,
-)
+async def _log_archive_loop():
+    """Archive expired partitions at startup, then once a day.
+
+    Runs on _LOG_WRITER, so a long export only delays queued log writes.
+    """
+    while True:
+        if SHEETS_BOOK and _claim_log_archive():
+            paths = await asyncio.wrap_future(
+                _LOG_WRITER.submit(archive_log_partitions)
+            )
+            if paths:
+                print("[INFO] archived log partitions:", ", ".join(paths))
+        await asyncio.sleep(LOG_ARCHIVE_CHECK_SECS)
+
+
+# ---------------- Analytics ----------------
+class Analytics:
+    """Usage counters with an all-time bucket and one bucket per day.
+
+    record() only bumps an in-memory Counter. flush() adds the pending
+    deltas to the shared store with incr, so workers sum up instead of
+    overwriting each other, and totals survive restarts. A query reads at
+    most ANALYTICS_KEEP_DAYS day buckets, however long the bot has run.
+    Keys are "metric|value", e.g. "menu|🧪 Service Demos" or "flow|lp:done".
+    """
+
+    MAX_VALUE_LEN = 64  # search terms are user text; keep keys short
+    DAYS_NS = "analytics:days"  # every day bucket written, for pruning
+
+    def __init__(self, kv: Optional[KVStore], keep_days: int = 90):
+        self._kv = kv if kv is not None else MemoryKV()
+        self.keep_days = keep_days
+        self._pending: Dict[str, Counter] = {}  # bucket -> deltas
+        self._lock = threading.Lock()
+        self._pruned_day = ""
+        self._known_days: set = set()  # day buckets already in DAYS_NS
+
+    @staticmethod
+    def _day(offset: int = 0) -> str:
+        return date.fromordinal(date.today().toordinal() - offset).isoformat()
+
+    def record(self, metric: str, value: str = "", n: int = 1):
+        key = f"{metric}|{value.strip()[: self.MAX_VALUE_LEN]}"
+        with self._lock:
+            for bucket in ("all", self._day()):
+                self._pending.setdefault(bucket, Counter())[key] += n
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            for bucket, counts in pending.items():
+                if bucket != "all" and bucket not in self._known_days:
+                    self._kv.set(self.DAYS_NS, bucket, "1")
+                    self._known_days.add(bucket)
+                for key in list(counts):
+                    self._kv.incr(f"analytics:{bucket}", key, counts[key])
+                    del counts[key]  # written, never re-queue it
+        except Exception as e:
+            print("[WARN] analytics flush issue:", e)
+            with self._lock:  # keep what wasn't written for the next flush
+                for bucket, counts in pending.items():
+                    self._pending.setdefault(bucket, Counter()).update(counts)
+            return
+        self._prune()
+
+    def _prune(self):
+        """Drop every day bucket outside the window (checked once a day).
+
+        Goes through DAYS_NS rather than just the day that fell out today,
+        so buckets missed during downtime are dropped too.
+        """
+        cutoff = self._day(self.keep_days)
+        if cutoff == self._pruned_day:
+            return
+        try:
+            for day in self._kv.items(self.DAYS_NS):
+                if day > cutoff:  # ISO dates order as strings
+                    continue
+                ns = f"analytics:{day}"
+                for key in self._kv.items(ns):
+                    self._kv.delete(ns, key)
+                self._kv.delete(self.DAYS_NS, day)
+                self._known_days.discard(day)
+        except Exception as e:
+            print("[WARN] analytics prune issue:", e)
+            return  # try again on the next flush
+        self._pruned_day = cutoff
+
+    def query(self, days: int = 0) -> Counter:
+        """Totals over the last `days` days (including today), or all time for 0."""
+        self.flush()
+        buckets = (
+            [self._day(i) for i in range(min(days, self.keep_days))]
+            if days > 0
+            else ["all"]
+        )
+        out: Counter = Counter()
+        for bucket in buckets:
+            for key, raw in self._kv.items(f"analytics:{bucket}").items():
+                out[key] += int(raw)
+        return out
+
+
+ANALYTICS = Analytics(SHARED_KV, ANALYTICS_KEEP_DAYS)
+atexit.register(ANALYTICS.flush)
+
+
+async def _analytics_flush_loop():
+    while True:
+        await asyncio.sleep(ANALYTICS_FLUSH_SECS)
+        await asyncio.to_thread(ANALYTICS.flush)
+
 
 # ---------------- States ----------------
 (
@@ -174,23 +1472,349 @@ def get_userpad(context: ContextTypes.DEFAULT_TYPE) -> Dict[str, Any]:
     return context.user_data["pad"]
 
 
+# ---------------- Session memory ----------------
+class SessionMemory:
+    """Per-user memory accounting, idle eviction and large pad payloads.
+
+    Sessions are kept in least-recently-used order. Each touch measures
+    the user's pad, evicts sessions idle for SESSION_IDLE_SECS and, while
+    the total is over SESSION_MEMORY_CAP, evicts the least recently used
+    ones. Big values (an uploaded logo as a data URI) are kept here and
+    the pad only holds a "blob:<hash>" reference to them.
+
+    The pad is persisted, so blobs are also written to the shared store
+    (when there is one) and resolve() falls back to it after a restart or
+    on another worker. Shared blobs are deleted with the flow, and ones
+    left behind are swept once they have been idle for idle_secs.
+    """
+
+    BLOB_NS = "session_blobs"  # "<bot>:<user>:<ref>" -> payload
+    INDEX_NS = "session_blobs:ts"  # same keys -> write time, cheap to scan
+    SWEEP_SECS = 60
+
+    def __init__(self, cap: int, idle_secs: float, kv: Optional[KVStore] = None):
+        self.cap = cap
+        self.idle_secs = idle_secs
+        self.evictions = 0
+        self._sessions: "OrderedDict[Tuple[int, int], Dict[str, Any]]" = OrderedDict()
+        self._total = 0
+        self._kv = kv
+        self._last_sweep = 0.0
+
+    @staticmethod
+    def _pad_bytes(user_data: Dict[str, Any]) -> int:
+        try:
+            return len(json.dumps(user_data.get("pad") or {}, default=str))
+        except Exception:
+            return 0
+
+    def _size(self, sess: Dict[str, Any]) -> int:
+        return sess["pad_bytes"] + sum(len(b) for b in sess["blobs"].values())
+
+    def _session(self, key: Tuple[int, int]) -> Dict[str, Any]:
+        sess = self._sessions.get(key)
+        if sess is None:
+            sess = {"seen": time.monotonic(), "user_data": None, "pad_bytes": 0}
+            sess["blobs"] = {}
+            self._sessions[key] = sess
+        return sess
+
+    def touch(self, key: Tuple[int, int], user_data: Optional[Dict[str, Any]]):
+        now = time.monotonic()
+        sess = self._session(key)
+        self._total -= self._size(sess)
+        sess["seen"] = now
+        if user_data is not None:
+            sess["user_data"] = user_data
+            sess["pad_bytes"] = self._pad_bytes(user_data)
+        self._total += self._size(sess)
+        self._sessions.move_to_end(key)
+        self._evict_idle(now)
+        self._enforce_cap()
+        if self._kv is not None and now - self._last_sweep >= self.SWEEP_SECS:
+            self._last_sweep = now
+            self._sweep_shared()
+
+    @staticmethod
+    def _shared_key(key: Tuple[int, int], ref: str) -> str:
+        return f"{key[0]}:{key[1]}:{ref}"
+
+    def _cache_blob(self, key: Tuple[int, int], ref: str, data: str):
+        sess = self._session(key)
+        if ref not in sess["blobs"]:
+            sess["blobs"][ref] = data
+            self._total += len(data)
+        self._sessions.move_to_end(key)
+        self._enforce_cap()
+
+    def put_blob(self, key: Tuple[int, int], data: str) -> str:
+        ref = "blob:" + hashlib.sha1(data.encode("utf-8")).hexdigest()[:24]
+        if self._kv is not None:
+            try:
+                shared_key = self._shared_key(key, ref)
+                self._kv.set(self.BLOB_NS, shared_key, data)
+                self._kv.set(self.INDEX_NS, shared_key, str(time.time()))
+            except Exception as e:
+                print("[WARN] shared blob write failed:", e)
+        self._cache_blob(key, ref, data)
+        return ref
+
+    def resolve(self, key: Tuple[int, int], value: Any, default: Any = None) -> Any:
+        """Swap a blob reference for its payload (default if it is gone)."""
+        if not (isinstance(value, str) and value.startswith("blob:")):
+            return value
+        sess = self._sessions.get(key)
+        if sess and value in sess["blobs"]:
+            return sess["blobs"][value]
+        if self._kv is None:
+            return default
+        try:
+            data = self._kv.get(self.BLOB_NS, self._shared_key(key, value))
+        except Exception as e:
+            print("[WARN] shared blob read failed:", e)
+            data = None
+        if data is None:
+            return default
+        self._cache_blob(key, value, data)
+        return data
+
+    def drop_blobs(self, key: Tuple[int, int]):
+        sess = self._sessions.get(key)
+        if sess:
+            self._total -= sum(len(b) for b in sess["blobs"].values())
+            sess["blobs"] = {}
+        if self._kv is not None:
+            prefix = self._shared_key(key, "")
+            try:
+                for shared_key in self._kv.items(self.INDEX_NS):
+                    if shared_key.startswith(prefix):
+                        self._kv.delete(self.BLOB_NS, shared_key)
+                        self._kv.delete(self.INDEX_NS, shared_key)
+            except Exception as e:
+                print("[WARN] shared blob delete failed:", e)
+
+    def _sweep_shared(self):
+        """Delete shared blobs older than idle_secs (abandoned flows, restarts)."""
+        cutoff = time.time() - self.idle_secs
+        try:
+            for shared_key, ts in self._kv.items(self.INDEX_NS).items():
+                if float(ts) < cutoff:
+                    self._kv.delete(self.BLOB_NS, shared_key)
+                    self._kv.delete(self.INDEX_NS, shared_key)
+        except Exception as e:
+            print("[WARN] shared blob sweep failed:", e)
+
+    def evict(self, key: Tuple[int, int]):
+        sess = self._sessions.pop(key, None)
+        if sess is None:
+            return
+        self._total -= self._size(sess)
+        self.evictions += 1
+        if sess["user_data"] is not None:
+            sess["user_data"].pop("pad", None)
+
+    def _evict_idle(self, now: float):
+        while self._sessions:
+            key, sess = next(iter(self._sessions.items()))
+            if now - sess["seen"] < self.idle_secs:
+                break
+            self.evict(key)
+
+    def _enforce_cap(self):
+        # never evict the most recent session, it's the one being served
+        while self._total > self.cap and len(self._sessions) > 1:
+            self.evict(next(iter(self._sessions)))
+
+    def report(self, top: int = 10) -> Dict[str, Any]:
+        per_user = sorted(
+            ((key, self._size(s)) for key, s in self._sessions.items()),
+            key=lambda kv: -kv[1],
+        )
+        return {
+            "sessions": len(self._sessions),
+            "total_bytes": self._total,
+            "cap_bytes": self.cap,
+            "evictions": self.evictions,
+            "top": per_user[:top],
+        }
+
+
+SESSIONS = SessionMemory(SESSION_MEMORY_CAP, SESSION_IDLE_SECS, SHARED_KV)
+
+
+def _session_key(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Tuple[int, int]:
+    user = update.effective_user
+    return (context.bot.id, user.id if user else 0)
+
+
+async def _touch_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs before every other handler (group -1)."""
+    if update.effective_user:
+        SESSIONS.touch(_session_key(update, context), context.user_data)
+
+
+async def conversation_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """ConversationHandler.TIMEOUT: drop the pad and its payloads."""
+    persistence = context.application.persistence
+    if isinstance(persistence, KVPersistence) and update.effective_chat:
+        chat_user = (update.effective_chat.id, update.effective_user.id)
+        if persistence.conversation_moved("main", chat_user):
+            return  # the user carried on with another worker
+    key = _session_key(update, context)
+    SESSIONS.drop_blobs(key)
+    context.user_data.pop("pad", None)
+
+
 # ---------------- Helpers ----------------
 def _bytes_to_data_uri(data: bytes, mime: str = "image/jpeg") -> str:
     b64 = base64.b64encode(data).decode("ascii")
     return f"data:{mime};base64,{b64}"
 
 
-def _is_admin(update: Update) -> bool:
+def _is_admin(
+    update: Update, context: Optional[ContextTypes.DEFAULT_TYPE] = None
+) -> bool:
+    admins = CONFIG.admin_usernames
+    if context is not None:
+        # per-bot override in multi-bot mode
+        admins = context.bot_data.get("config", {}).get("admins") or admins
     uname = (update.effective_user.username or "").lower()
-    return bool(uname and uname in ADMIN_USERNAMES) or (
-        not ADMIN_USERNAMES
-    )  # if no env set, allow all
+    return bool(uname and uname in admins) or (not admins)  # if no env set, allow all
 
 
 def _chunk(lst: List, size: int) -> List[List]:
     return [lst[i : i + size] for i in range(0, len(lst), size)]
 
 
+# ======================================================
+# Demo search (trigram index)
+# ======================================================
+def _trigrams(text: str) -> set:
+    """Word-padded trigrams, so short words and word edges still match."""
+    grams = set()
+    for word in re.findall(r"\w+", text.lower()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i : i + 3])
+    return grams
+
+
+class DemoSearchIndex:
+    """Typo-tolerant ranked search over (name, url, category, order) tuples.
+
+    An inverted trigram index maps each trigram to the entries whose name
+    contains it. A query scores every entry by the share of its trigrams
+    found in the name (plus a small Dice term so tighter names win), adds
+    a lower-weighted category score, and ranks ties by order. Queries
+    under 3 characters, or with no trigram hits, also get substring
+    matches (from a bigram index for 2 characters, else a scan). Results
+    are cached per query until the catalog changes.
+    """
+
+    NAME_WEIGHT = 2.0
+    CATEGORY_WEIGHT = 1.0
+    MIN_SIMILARITY = 0.4
+    CACHE_SIZE = 256
+
+    def __init__(self, entries: List[Tuple[str, str, str, int]]):
+        # kept in tiebreak (order, name) order, so equal scores rank by index
+        self._entries = sorted(entries, key=lambda e: (e[3], e[0].lower()))
+        self._lower = [e[0].lower() for e in self._entries]
+        # all names in one string, so the substring fallback runs in C
+        self._joined = "\n".join(self._lower)
+        self._starts = []
+        pos = 0
+        for name in self._lower:
+            self._starts.append(pos)
+            pos += len(name) + 1
+        self._postings: Dict[str, List[int]] = {}
+        self._bigrams: Dict[str, List[int]] = {}  # 2-char queries, no scan
+        self._name_sizes: List[int] = []
+        self._by_category: Dict[str, List[int]] = {}
+        for i, (name, _url, cat, _order) in enumerate(self._entries):
+            grams = _trigrams(name)
+            self._name_sizes.append(len(grams))
+            for g in grams:
+                self._postings.setdefault(g, []).append(i)
+            lower = self._lower[i]
+            for b in {lower[j : j + 2] for j in range(len(lower) - 1)}:
+                self._bigrams.setdefault(b, []).append(i)
+            self._by_category.setdefault(cat, []).append(i)
+        self._cat_grams = {c: _trigrams(c) for c in self._by_category}
+        self._cache: "OrderedDict[str, List[Tuple[str, str, str, int]]]" = OrderedDict()
+
+    def search(self, query: str) -> List[Tuple[str, str, str, int]]:
+        q = " ".join(query.lower().split())
+        hit = self._cache.get(q)
+        if hit is not None:
+            self._cache.move_to_end(q)
+            return hit
+        result = self._rank(q)
+        self._cache[q] = result
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+    def _rank(self, q: str) -> List[Tuple[str, str, str, int]]:
+        if not q:
+            return []
+        qgrams = _trigrams(q)
+        nq = len(qgrams) or 1
+        shared: Counter = Counter()
+        for g in qgrams:
+            posting = self._postings.get(g)
+            if posting:
+                shared.update(posting)
+
+        lower, sizes = self._lower, self._name_sizes
+        scores: Dict[int, float] = {}
+        for i, n in shared.items():
+            contain = n / nq
+            if contain >= self.MIN_SIMILARITY or q in lower[i]:
+                dice = 2 * n / (nq + sizes[i])
+                scores[i] = self.NAME_WEIGHT * (0.8 * max(contain, 0.5) + 0.2 * dice)
+        if len(q) < 3 or not scores:
+            # trigrams miss short mid-word fragments ("es" in "websites"),
+            # so fall back to substring matches, ranked below the above
+            if len(q) == 2:
+                hits = self._bigrams.get(q, [])
+            else:
+                hits = [
+                    bisect.bisect_right(self._starts, m.start()) - 1
+                    for m in re.finditer(re.escape(q), self._joined)
+                ]
+            fallback = self.NAME_WEIGHT * 0.4
+            for i in hits:
+                scores.setdefault(i, fallback)
+
+        cat_bonus: Dict[str, float] = {}
+        for cat, grams in self._cat_grams.items():
+            sim = 1.0 if q in cat.lower() else len(qgrams & grams) / nq
+            if sim >= self.MIN_SIMILARITY:
+                cat_bonus[cat] = self.CATEGORY_WEIGHT * sim
+
+        entries = self._entries
+        if cat_bonus:
+            for i in scores:
+                scores[i] += cat_bonus.get(entries[i][2], 0.0)
+        # substring hits and category-only matches share a handful of
+        # scores, so bucket by score and sort plain ints within each bucket
+        # instead of sorting every hit by a (score, order, name) key
+        buckets: Dict[float, List[int]] = {}
+        for i, score in scores.items():
+            buckets.setdefault(score, []).append(i)
+        for cat, bonus in cat_bonus.items():
+            buckets.setdefault(bonus, []).extend(
+                i for i in self._by_category[cat] if i not in scores
+            )
+        out = []
+        for score in sorted(buckets, reverse=True):
+            ids = buckets[score]
+            ids.sort()
+            out.extend([entries[i] for i in ids])
+        return out
+
+
 # ======================================================
 # Service Demo Store  (Sheets-backed with in-memory fallback)
 # ======================================================
@@ -214,19 +1838,32 @@ class ServiceDemoStore:
             ("YouTube Playlist", "https://youtube.com/", "Media", 7),
         ]
         self._loaded = False
+        self._version = 0  # shared catalog version this process has loaded
+        self._index: Optional[DemoSearchIndex] = None  # rebuilt on change
+        self.revision = 0  # bumped whenever the catalog changes
+
+    def _changed(self):
+        self._index = None
+        self.revision += 1
 
     def _read_from_sheet(self) -> Optional[List[Tuple[str, str, str, int]]]:
         global SHEETS_DEMOS_WS
         if not SHEETS_DEMOS_WS:
             return None
         try:
-            rows = SHEETS_DEMOS_WS.get_all_values()
+            rows = google_call("sheets.get_all_values", SHEETS_DEMOS_WS.get_all_values)
             # expect header
             if not rows or rows[0][:3] != ["Name", "URL", "Category"]:
                 # normalize header at least
                 if rows and rows[0] != ["Name", "URL", "Category", "Order"]:
-                    SHEETS_DEMOS_WS.update([["Name", "URL", "Category", "Order"]])
-                rows = SHEETS_DEMOS_WS.get_all_values()
+                    google_call(
+                        "sheets.update",
+                        SHEETS_DEMOS_WS.update,
+                        [["Name", "URL", "Category", "Order"]],
+                    )
+                rows = google_call(
+                    "sheets.get_all_values", SHEETS_DEMOS_WS.get_all_values
+                )
             data = []
             for r in rows[1:]:
                 name = (r[0] if len(r) > 0 else "").strip()
@@ -250,8 +1887,11 @@ class ServiceDemoStore:
         if not SHEETS_DEMOS_WS:
             return
         try:
-            SHEETS_DEMOS_WS.append_row(
-                [name, url, cat, str(order)], value_input_option="USER_ENTERED"
+            google_call(
+                "sheets.append_row",
+                SHEETS_DEMOS_WS.append_row,
+                [name, url, cat, str(order)],
+                value_input_option="USER_ENTERED",
             )
         except Exception as e:
             print("[WARN] append ServiceDemos failed:", e)
@@ -261,38 +1901,74 @@ class ServiceDemoStore:
         if not SHEETS_DEMOS_WS:
             return False
         try:
-            cells = SHEETS_DEMOS_WS.findall(name)
+            cells = google_call("sheets.findall", SHEETS_DEMOS_WS.findall, name)
             # delete rows that match exactly in Name col
             for c in cells:
                 if c.col == 1:
                     # verify row data
-                    row_vals = SHEETS_DEMOS_WS.row_values(c.row)
+                    row_vals = google_call(
+                        "sheets.row_values", SHEETS_DEMOS_WS.row_values, c.row
+                    )
                     if row_vals and row_vals[0] == name:
-                        SHEETS_DEMOS_WS.delete_rows(c.row)
+                        google_call(
+                            "sheets.delete_rows", SHEETS_DEMOS_WS.delete_rows, c.row
+                        )
                         return True
             return False
         except Exception as e:
             print("[WARN] delete ServiceDemos failed:", e)
             return False
 
+    def _publish(self):
+        """Share the catalog and bump its version so other workers reload."""
+        if SHARED_KV is None:
+            return
+        try:
+            SHARED_KV.set("demos", "catalog", json.dumps(self._mem))
+            self._version = SHARED_KV.incr("demos", "version")
+        except Exception as e:
+            print("[WARN] publish demos failed:", e)
+
+    def _shared_version(self) -> int:
+        try:
+            return int(SHARED_KV.get("demos", "version") or 0)
+        except Exception as e:
+            print("[WARN] read demos version failed:", e)
+            return self._version
+
     def load(self):
-        if self._loaded:
+        if not self._loaded:
+            # the sheet is the source of truth when this worker starts
+            sheet_data = self._read_from_sheet()
+            if sheet_data is not None:
+                self._mem = sheet_data
+                self._changed()
+                self._publish()
+            self._loaded = True
+            if sheet_data is not None or SHARED_KV is None:
+                return
+        if SHARED_KV is None:
             return
-        sheet_data = self._read_from_sheet()
-        if sheet_data is not None:
-            self._mem = sheet_data
-        self._loaded = True
+        version = self._shared_version()
+        if version == self._version:
+            return
+        raw = SHARED_KV.get("demos", "catalog")
+        if raw:
+            self._mem = [tuple(d) for d in json.loads(raw)]
+            self._changed()
+        self._version = version
 
     def list(
         self, category: Optional[str] = None, search: Optional[str] = None
     ) -> List[Tuple[str, str, str, int]]:
         self.load()
         data = self._mem
+        if search:
+            if self._index is None:
+                self._index = DemoSearchIndex(self._mem)
+            data = self._index.search(search)
         if category and category.lower() != "all":
             data = [d for d in data if d[2].lower() == category.lower()]
-        if search:
-            q = search.lower()
-            data = [d for d in data if q in d[0].lower() or q in d[2].lower()]
         return data
 
     def categories(self) -> List[str]:
@@ -313,6 +1989,8 @@ class ServiceDemoStore:
         if order is None:
             order = max([d[3] for d in self._mem] or [0]) + 1
         self._mem.append((name, url, category or "General", int(order)))
+        self._changed()
+        self._publish()
         # persist if sheet available
         self._write_to_sheet_append(name, url, category or "General", int(order))
         return "Added."
@@ -327,6 +2005,8 @@ class ServiceDemoStore:
         if idx is None:
             return "Not found."
         del self._mem[idx]
+        self._changed()
+        self._publish()
         # try sheet delete as well
         deleted = self._delete_from_sheet_by_name(name)
         if deleted:
@@ -334,25 +2014,153 @@ class ServiceDemoStore:
         return "Removed (memory)."
 
 
-DEMO_STORE = ServiceDemoStore()
+DEMO_STORE = ServiceDemoStore()
+
+
+# ======================================================
+# Demo link health
+# ======================================================
+class DemoHealthChecker:
+    """Checks demo URLs concurrently and caches the result per URL.
+
+    One pooled httpx.AsyncClient is used per run, with a global
+    concurrency cap, a per-host cap and a request timeout. Results are
+    kept for DEMO_HEALTH_TTL and persisted in the shared KV store, so
+    restarts and other workers reuse them. `revision` changes whenever a
+    link flips between working and broken.
+    """
+
+    NS = "demo_health"
+    # sites often refuse bots/HEAD; don't call those links broken
+    SOFT_FAIL = {401, 403, 405, 429}
+
+    def __init__(self, kv: Optional[KVStore] = None):
+        self._kv = kv
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self.revision = 0
+
+    def _load(self):
+        if self._loaded or self._kv is None:
+            self._loaded = True
+            return
+        try:
+            for url, raw in self._kv.items(self.NS).items():
+                self._status[url] = json.loads(raw)
+        except Exception as e:
+            print("[WARN] read demo health failed:", e)
+        self._loaded = True
+
+    def status(self, url: str) -> Optional[Dict[str, Any]]:
+        self._load()
+        return self._status.get(url)
+
+    def is_broken(self, url: str) -> bool:
+        st = self.status(url)
+        return bool(st) and not st.get("ok", True)
+
+    def _stale(self, url: str, now: float) -> bool:
+        st = self._status.get(url)
+        return st is None or now - st.get("checked", 0) >= DEMO_HEALTH_TTL
+
+    def _set(self, url: str, record: Dict[str, Any]):
+        prev = self._status.get(url)
+        if prev is None or prev.get("ok") != record["ok"]:
+            self.revision += 1
+        self._status[url] = record
+        if self._kv is not None:
+            try:
+                self._kv.set(self.NS, url, json.dumps(record))
+            except Exception as e:
+                print("[WARN] write demo health failed:", e)
+
+    async def check_all(self, urls: List[str], force: bool = False, client=None) -> int:
+        """Check every stale URL (all of them with force); returns how many."""
+        self._loaded = False
+        self._load()  # pick up results written by other workers
+        now = time.time()
+        due = sorted({u for u in urls if force or self._stale(u, now)})
+        if not due:
+            return 0
+        sem = asyncio.Semaphore(max(1, DEMO_HEALTH_CONCURRENCY))
+        per_host: Dict[str, asyncio.Semaphore] = {}
+
+        async def run(c, url: str):
+            host = urlsplit(url).netloc.lower()
+            host_sem = per_host.setdefault(
+                host, asyncio.Semaphore(max(1, DEMO_HEALTH_PER_HOST))
+            )
+            # per-host slot first, so URLs queued behind a busy host don't
+            # sit on global slots other hosts could use
+            async with host_sem, sem:
+                self._set(url, await self._check(c, url))
+
+        if client is not None:
+            await asyncio.gather(*(run(client, u) for u in due))
+        else:
+            import httpx
+
+            async with httpx.AsyncClient(
+                timeout=DEMO_HEALTH_TIMEOUT,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=DEMO_HEALTH_CONCURRENCY),
+                headers={"User-Agent": "Mozilla/5.0 (metabot link check)"},
+            ) as c:
+                await asyncio.gather(*(run(c, u) for u in due))
+        return len(due)
+
+    async def _check(self, client, url: str) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"checked": time.time(), "status": None, "error": ""}
+        try:
+            resp = await client.head(url)
+            if resp.status_code >= 400:
+                # some servers only answer GET properly
+                async with client.stream("GET", url) as resp:
+                    pass
+            record["status"] = resp.status_code
+            record["ok"] = resp.status_code < 400 or resp.status_code in self.SOFT_FAIL
+        except Exception as e:
+            record["error"] = type(e).__name__
+            record["ok"] = False
+        return record
+
+
+DEMO_HEALTH = DemoHealthChecker(SHARED_KV)
+
+
+async def _demo_health_loop():
+    while True:
+        try:
+            await DEMO_HEALTH.check_all([d[1] for d in DEMO_STORE.list()])
+        except Exception as e:
+            print("[WARN] demo health check failed:", e)
+        await asyncio.sleep(DEMO_HEALTH_INTERVAL)
+
+
+def _visible_demos(
+    demos: List[Tuple[str, str, str, int]],
+) -> List[Tuple[str, str, str, int]]:
+    if not DEMO_HIDE_BROKEN:
+        return demos
+    return [d for d in demos if not DEMO_HEALTH.is_broken(d[1])]
+
 
 # ======================================================
 # Demos UI
 # ======================================================
-DEMOS_PAGE_SIZE = 6  # number of link buttons per page
-
-
 def _build_demos_keyboard(
     demos: List[Tuple[str, str, str, int]], page: int, category: str, search: str
 ) -> InlineKeyboardMarkup:
     total = len(demos)
-    start = page * DEMOS_PAGE_SIZE
-    end = start + DEMOS_PAGE_SIZE
+    page_size = CONFIG.demos_page_size
+    start = page * page_size
+    end = start + page_size
     slice_ = demos[start:end]
 
     rows = []
     for name, url, cat, _ord in slice_:
-        rows.append([InlineKeyboardButton(f"🔗 {name}", url=url)])
+        icon = "⚠️" if DEMO_HEALTH.is_broken(url) else "🔗"
+        rows.append([InlineKeyboardButton(f"{icon} {name}", url=url)])
 
     # nav row
     nav = []
@@ -403,6 +2211,12 @@ async def open_demos_browser(
     demos = DEMO_STORE.list(
         category=None if category == "All" else category, search=search or None
     )
+    demos = _visible_demos(demos)
+    if page == 0:  # a new browse, not paging through one
+        if category != "All":
+            ANALYTICS.record("demo_category", category)
+        if search:
+            ANALYTICS.record("demo_search", search.lower())
     if not demos:
         await (
             update.callback_query.edit_message_text
@@ -426,9 +2240,462 @@ async def open_demos_browser(
         )
 
 
+# ======================================================
+# AI Copy (Gemini)
+# ======================================================
+COPY_PROMPT = (
+    "Write landing page copy for a business named \"{title}\" in the "
+    "\"{niche}\" niche. Reply with JSON only, using the keys: heading "
+    "(max 8 words), subheading (max 15 words), description (1-3 sentences), "
+    "keywords (comma separated, max 8)."
+)
+
+
+def _normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+
+def _parse_copy(text: str) -> Dict[str, str]:
+    """Pull heading/subheading/description/keywords out of a model reply."""
+    data: Dict[str, Any] = {}
+    m = re.search(r"\{.*\}", text, flags=re.DOTALL)
+    if m:
+        try:
+            data = json.loads(m.group(0))
+        except Exception:
+            data = {}
+    kws = data.get("keywords", "")
+    if isinstance(kws, list):
+        kws = ", ".join(str(k) for k in kws)
+    return {
+        "heading": str(data.get("heading", "")).strip(),
+        "subheading": str(data.get("subheading", "")).strip(),
+        "description": str(data.get("description", "") or text).strip(),
+        "keywords": str(kws).strip(),
+    }
+
+
+class CopyGenerator:
+    """Generates landing page copy with a cached, rate-limited model.
+
+    `model` is anything with an async `generate_content_async(prompt,
+    stream=True)` returning an async iterator of chunks with `.text`
+    (google-generativeai's GenerativeModel, or a local stub).
+    Results are cached by normalized prompt (TTL + LRU), identical
+    in-flight prompts share one model call, and at most
+    `max_concurrency` calls run at once.
+    """
+
+    def __init__(
+        self,
+        model=None,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        ttl: float = AI_CACHE_TTL,
+        max_entries: int = AI_CACHE_SIZE,
+    ):
+        self.model = model
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, str]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._sem = asyncio.Semaphore(max(1, max_concurrency))
+
+    @property
+    def available(self) -> bool:
+        return self.model is not None
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, str]]:
+        hit = self._cache.get(key)
+        if hit is None:
+            return None
+        expires, value = hit
+        if expires < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return value
+
+    def _cache_put(self, key: str, value: Dict[str, str]):
+        self._cache[key] = (time.monotonic() + self._ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+
+    async def generate(self, niche: str, title: str, on_partial=None) -> Dict[str, str]:
+        """Return copy for niche/title. `on_partial(text)` gets streamed text."""
+        prompt = COPY_PROMPT.format(niche=niche.strip(), title=title.strip())
+        key = _normalize_prompt(prompt)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # this task was cancelled, not the shared call
+                # the leader was cancelled; that's a miss, not our failure
+                return await self.generate(niche, title, on_partial)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await self._call(prompt, on_partial)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved; followers re-raise it themselves
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._cache_put(key, result)
+        fut.set_result(result)
+        return result
+
+    async def _call(self, prompt: str, on_partial=None) -> Dict[str, str]:
+        async with self._sem:
+            response = await self.model.generate_content_async(prompt, stream=True)
+            text = ""
+            async for chunk in response:
+                text += getattr(chunk, "text", "") or ""
+                if on_partial:
+                    await on_partial(text)
+        return _parse_copy(text)
+
+
+def _try_init_gemini():
+    if not GEMINI_API_KEY:
+        return None
+    try:
+        import google.generativeai as genai
+
+        genai.configure(api_key=GEMINI_API_KEY)
+        return genai.GenerativeModel(GEMINI_MODEL)
+    except Exception as e:
+        print("[WARN] Gemini init issue:", e)
+        return None
+
+
+COPY_GEN = CopyGenerator(_try_init_gemini())
+
+
+# ======================================================
+# Landing page hosting
+# ======================================================
+SLUG_RE = re.compile(r"^[a-z0-9_-]{1,80}$")
+
+
+class PageHost:
+    """Serves published landing pages over a small built-in HTTP/1.1 server.
+
+    publish() writes index.html plus precompressed .gz and .br (brotli is
+    in requirements.txt; without it only gzip) under LP_HOST_DIR/<slug>/.
+    Responses pick the best encoding from Accept-Encoding, carry ETag,
+    Last-Modified and Cache-Control, and answer conditional requests with
+    304. Recently used pages stay in memory (LRU, bounded by
+    LP_HOT_SET_BYTES). publish() runs in a worker thread while the server
+    reads the hot set on the event loop, so the hot set is guarded by a
+    lock.
+    """
+
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"), ("identity", ""))
+
+    def __init__(self, root: str, hot_bytes: int):
+        self.root = root
+        self.hot_bytes = hot_bytes
+        self._hot: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._hot_total = 0
+        self._hot_lock = threading.Lock()
+        self._server = None
+
+    def url_for(self, slug: str) -> Optional[str]:
+        """Public link to a page, or None when LP_PUBLIC_URL isn't set."""
+        if not LP_PUBLIC_URL:
+            return None  # a localhost link means nothing to a chat user
+        return f"{LP_PUBLIC_URL.rstrip('/')}/{slug}"
+
+    def publish(self, name: str, html_text: str) -> str:
+        """Store a page and return its slug; same content, same slug."""
+        raw = html_text.encode("utf-8")
+        digest = hashlib.sha1(raw).hexdigest()
+        base = re.sub(r"[^a-z0-9_-]+", "-", name.lower()).strip("-")[:60] or "page"
+        slug = f"{base}-{digest[:8]}"
+        folder = os.path.join(self.root, slug)
+        os.makedirs(folder, exist_ok=True)
+        variants = {"identity": raw, "gzip": gzip.compress(raw, compresslevel=9)}
+        try:
+            import brotli
+
+            variants["br"] = brotli.compress(raw, quality=11)
+        except ImportError:
+            pass
+        for enc, ext in self.ENCODINGS:
+            if enc in variants:
+                with open(os.path.join(folder, "index.html" + ext), "wb") as f:
+                    f.write(variants[enc])
+        self._hot_put(slug, self._entry(folder, digest, variants))
+        return slug
+
+    @staticmethod
+    def _entry(folder: str, digest: str, variants: Dict[str, bytes]) -> Dict[str, Any]:
+        mtime = int(os.path.getmtime(os.path.join(folder, "index.html")))
+        return {
+            "etag": f'"{digest[:16]}"',
+            "mtime": mtime,
+            "last_modified": formatdate(mtime, usegmt=True),
+            "variants": variants,
+            "size": sum(len(v) for v in variants.values()),
+        }
+
+    def _hot_put(self, slug: str, entry: Dict[str, Any]):
+        with self._hot_lock:
+            old = self._hot.pop(slug, None)
+            if old:
+                self._hot_total -= old["size"]
+            self._hot[slug] = entry
+            self._hot_total += entry["size"]
+            while self._hot_total > self.hot_bytes and len(self._hot) > 1:
+                _slug, evicted = self._hot.popitem(last=False)
+                self._hot_total -= evicted["size"]
+
+    def _get(self, slug: str) -> Optional[Dict[str, Any]]:
+        with self._hot_lock:
+            entry = self._hot.get(slug)
+            if entry is not None:
+                self._hot.move_to_end(slug)
+                return entry
+        folder = os.path.join(self.root, slug)
+        variants = {}
+        for enc, ext in self.ENCODINGS:
+            try:
+                with open(os.path.join(folder, "index.html" + ext), "rb") as f:
+                    variants[enc] = f.read()
+            except FileNotFoundError:
+                pass
+        if "identity" not in variants:
+            return None
+        entry = self._entry(
+            folder, hashlib.sha1(variants["identity"]).hexdigest(), variants
+        )
+        self._hot_put(slug, entry)
+        return entry
+
+    @staticmethod
+    def _accepted(header: str) -> set:
+        accepted = set()
+        for part in header.split(","):
+            token, _, params = part.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(token.strip().lower())
+        return accepted
+
+    def respond(
+        self, method: str, path: str, headers: Dict[str, str]
+    ) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        if method not in ("GET", "HEAD"):
+            return 405, [("Allow", "GET, HEAD")], b""
+        slug = unquote(urlsplit(path).path).strip("/")
+        entry = self._get(slug) if SLUG_RE.match(slug) else None
+        if entry is None:
+            return 404, [("Content-Type", "text/plain")], b"Not found"
+        common = [
+            ("ETag", entry["etag"]),
+            ("Last-Modified", entry["last_modified"]),
+            ("Cache-Control", f"public, max-age={LP_CACHE_MAX_AGE}"),
+            ("Vary", "Accept-Encoding"),
+        ]
+        inm = headers.get("if-none-match")
+        if inm is not None:
+            tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+            if entry["etag"] in tags or "*" in tags:
+                return 304, common, b""
+        elif headers.get("if-modified-since"):
+            try:
+                since = parsedate_to_datetime(headers["if-modified-since"])
+                if int(since.timestamp()) >= entry["mtime"]:
+                    return 304, common, b""
+            except (TypeError, ValueError):
+                pass
+        accepted = self._accepted(headers.get("accept-encoding", ""))
+        for enc, _ext in self.ENCODINGS:
+            if enc in entry["variants"] and (enc == "identity" or enc in accepted):
+                body = entry["variants"][enc]
+                break
+        extra = [("Content-Type", "text/html; charset=utf-8")]
+        if enc != "identity":
+            extra.append(("Content-Encoding", enc))
+        return 200, common + extra, body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """One connection; HTTP/1.1 keep-alive until the client closes or idles."""
+        reasons = {
+            200: "OK",
+            304: "Not Modified",
+            404: "Not Found",
+            405: "Method Not Allowed",
+        }
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 15)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                parts = lines[0].split()
+                if len(parts) != 3:
+                    break
+                method, path, version = parts
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                status, out_headers, body = self.respond(method, path, headers)
+                conn = headers.get("connection", "").lower()
+                keep = (
+                    conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+                )
+                out = [f"HTTP/1.1 {status} {reasons.get(status, '')}"]
+                out += [f"{k}: {v}" for k, v in out_headers]
+                out.append(f"Content-Length: {len(body)}")
+                out.append("Connection: " + ("keep-alive" if keep else "close"))
+                writer.write(("\r\n".join(out) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD" and status not in (304,):
+                    writer.write(body)
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self.handle, LP_HOST_BIND, LP_HOST_PORT
+        )
+        print(f"Hosting landing pages on {LP_HOST_BIND}:{LP_HOST_PORT}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+PAGE_HOST = PageHost(LP_HOST_DIR, LP_HOT_SET_BYTES) if LP_HOST_PORT else None
+
+
+# ======================================================
+# Telegram file_id reuse
+# ======================================================
+class FileIdCache:
+    """LRU map of (bot, kind, sha256 of name + bytes) -> Telegram file_id.
+
+    file_ids are only valid for the bot that uploaded the file, hence the
+    bot id in the key. Entries are mirrored to the shared store (with a
+    timestamp, so the newest `size` survive a restart) and a miss here
+    falls back to the store, which picks up uploads by other workers.
+    """
+
+    NS = "file_ids"
+
+    def __init__(self, kv: Optional[KVStore], size: int):
+        self._kv = kv
+        self.size = size
+        self._ids: "OrderedDict[str, str]" = OrderedDict()
+        if kv is not None:
+            try:
+                stored = [(k, json.loads(v)) for k, v in kv.items(self.NS).items()]
+            except Exception as e:
+                print("[WARN] file_id cache load failed:", e)
+                stored = []
+            stored.sort(key=lambda item: item[1].get("ts", 0))
+            for key, entry in stored:
+                self._ids[key] = entry["file_id"]
+            self._trim()
+
+    @staticmethod
+    def key(bot_id: int, kind: str, data: bytes, filename: str = "") -> str:
+        digest = hashlib.sha256(filename.encode("utf-8") + b"\0" + data).hexdigest()
+        return f"{bot_id}:{kind}:{digest}"
+
+    def get(self, key: str) -> Optional[str]:
+        file_id = self._ids.get(key)
+        if file_id is None and self._kv is not None:
+            try:
+                raw = self._kv.get(self.NS, key)
+            except Exception:
+                raw = None
+            if raw:
+                file_id = json.loads(raw)["file_id"]
+        if file_id is not None:
+            self._ids[key] = file_id
+            self._ids.move_to_end(key)
+        return file_id
+
+    def put(self, key: str, file_id: str):
+        self._ids[key] = file_id
+        self._ids.move_to_end(key)
+        if self._kv is not None:
+            try:
+                self._kv.set(
+                    self.NS, key, json.dumps({"file_id": file_id, "ts": time.time()})
+                )
+            except Exception as e:
+                print("[WARN] file_id cache write failed:", e)
+        self._trim()
+
+    def drop(self, key: str):
+        self._ids.pop(key, None)
+        if self._kv is not None:
+            try:
+                self._kv.delete(self.NS, key)
+            except Exception:
+                pass
+
+    def _trim(self):
+        while len(self._ids) > self.size:
+            key, _ = self._ids.popitem(last=False)
+            if self._kv is not None:
+                try:
+                    self._kv.delete(self.NS, key)
+                except Exception:
+                    pass
+
+
+FILE_IDS = FileIdCache(SHARED_KV, FILE_ID_CACHE_SIZE)
+
+
+async def reply_file(message, kind: str, data: bytes, filename: str, **kwargs):
+    """reply_document / reply_photo that reuses the file_id of identical content.
+
+    Falls back to uploading the bytes when Telegram rejects a cached file_id.
+    """
+    send = message.reply_document if kind == "document" else message.reply_photo
+    key = FileIdCache.key(message.get_bot().id, kind, data, filename)
+    file_id = FILE_IDS.get(key)
+    if file_id is not None:
+        try:
+            return await send(file_id, **kwargs)
+        except BadRequest as e:
+            print("[WARN] cached file_id rejected, re-uploading:", e)
+            FILE_IDS.drop(key)
+    sent = await send(InputFile(data, filename=filename), **kwargs)
+    attachment = sent.document if kind == "document" else (sent.photo or [None])[-1]
+    if attachment is not None:
+        FILE_IDS.put(key, attachment.file_id)
+    return sent
+
+
 # ======================================================
 # Core Handlers
 # ======================================================
+@profiled
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (
         "Hey! 👋 Main **MetaBull Universe** ka assistant hoon.\n\n"
@@ -440,21 +2707,26 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "• ⛔ Cancel — Current flow stop\n\n"
         "Ready when you are. 🚀"
     )
-    await update.message.reply_text(text, reply_markup=MAIN_KB)
+    await update.message.reply_text(text, reply_markup=CONFIG.main_kb)
     user = f"{update.effective_user.full_name} (@{update.effective_user.username})"
     log_to_google(user, "/start", "Shown main menu")
     return STATE_IDLE
 
 
+@profiled
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    await update.message.reply_text("Ok, sab cancel ho gaya. ✅", reply_markup=MAIN_KB)
+    SESSIONS.drop_blobs(_session_key(update, context))
+    await update.message.reply_text(
+        "Ok, sab cancel ho gaya. ✅", reply_markup=CONFIG.main_kb
+    )
     user = f"{update.effective_user.full_name} (@{update.effective_user.username})"
     log_to_google(user, "Cancel pressed", "Cleared state")
     return STATE_IDLE
 
 
 # ----- Create a Post -----
+@profiled
 async def create_post_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
     pad.clear()
@@ -463,9 +2735,11 @@ async def create_post_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     user = f"{update.effective_user.full_name} (@{update.effective_user.username})"
     log_to_google(user, "Create a Post selected", "Waiting image")
+    ANALYTICS.record("flow", "post:start")
     return STATE_CREATE_POST_WAIT_IMAGE
 
 
+@profiled
 async def create_post_got_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
     if not update.message.photo:
@@ -475,14 +2749,26 @@ async def create_post_got_image(update: Update, context: ContextTypes.DEFAULT_TY
     await update.message.reply_text(
         "Great! Ab **phone/email/website/link** bhejein (ek line me)."
     )
+    ANALYTICS.record("flow", "post:image")
     return STATE_CREATE_POST_WAIT_LINK
 
 
+def _cta_type(link: str) -> str:
+    if link.startswith("http"):
+        return "url"
+    if re.match(r"^\+?\d{8,}$", link):
+        return "phone"
+    if "@" in link:
+        return "email"
+    return "other"
+
+
 def _build_post_cta_buttons(link: str) -> InlineKeyboardMarkup:
     btns = []
-    if link.startswith("http"):
+    kind = _cta_type(link)
+    if kind == "url":
         btns.append([InlineKeyboardButton("🌐 Visit Link", url=link)])
-    elif re.match(r"^\+?\d{8,}$", link):
+    elif kind == "phone":
         btns.append([InlineKeyboardButton("📞 Call Now", url=f"tel:{link}")])
         btns.append(
             [
@@ -491,7 +2777,7 @@ def _build_post_cta_buttons(link: str) -> InlineKeyboardMarkup:
                 )
             ]
         )
-    elif "@" in link:
+    elif kind == "email":
         btns.append([InlineKeyboardButton("✉️ Send Email", url=f"mailto:{link}")])
     else:
         btns.append(
@@ -505,9 +2791,17 @@ def _build_post_cta_buttons(link: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(btns)
 
 
+@profiled
 async def create_post_got_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
     link = (update.message.text or "").strip()
+    if "post_image_file_id" not in pad:
+        # pad was evicted (idle/memory cap) mid-flow
+        await update.message.reply_text(
+            "Session expire ho gaya, photo dobara bhejein.",
+            reply_markup=CONFIG.main_kb,
+        )
+        return STATE_IDLE
     pad["post_link"] = link
     caption = (
         "✨ MetaBull Universe — Creative + IT + Marketing\n"
@@ -522,7 +2816,9 @@ async def create_post_got_link(update: Update, context: ContextTypes.DEFAULT_TYP
     )
     user = f"{update.effective_user.full_name} (@{update.effective_user.username})"
     log_to_google(user, f"[Create Post] link={link}", caption)
-    await update.message.reply_text("Post ready ✅", reply_markup=MAIN_KB)
+    ANALYTICS.record("flow", "post:done")
+    ANALYTICS.record("post_cta", _cta_type(link))
+    await update.message.reply_text("Post ready ✅", reply_markup=CONFIG.main_kb)
     pad.clear()
     return STATE_IDLE
 
@@ -596,24 +2892,41 @@ LP_TEMPLATE = """<!DOCTYPE html> <html lang="en">
 </html>"""
 
 
+@profiled
 async def create_lp_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
     pad.clear()
     await update.message.reply_text("🌐 Landing Page: Page ka **name/title** bhejein.")
+    ANALYTICS.record("flow", "lp:start")
     return STATE_CREATE_LP_NAME
 
 
+async def _lp_pad_lost(update: Update, pad: Dict[str, Any]) -> bool:
+    """True (after asking for the name again) if the pad was evicted mid-flow."""
+    if "lp_title" in pad:
+        return False
+    await update.message.reply_text(
+        "Session expire ho gaya 😕 Page ka **name/title** dobara bhejein."
+    )
+    return True
+
+
+@profiled
 async def create_lp_get_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
     pad["lp_title"] = update.message.text.strip()
     await update.message.reply_text(
         "Logo/Image ka **URL** bhejein (https://...) **ya** seedha **photo upload** kar dein."
     )
+    ANALYTICS.record("flow", "lp:name")
     return STATE_CREATE_LP_LOGO
 
 
+@profiled
 async def create_lp_get_logo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
+    if await _lp_pad_lost(update, pad):
+        return STATE_CREATE_LP_NAME
     # Photo path
     if update.message and update.message.photo:
         try:
@@ -623,10 +2936,14 @@ async def create_lp_get_logo(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await file.download_to_memory(out=bio)
             bio.seek(0)
             data_uri = _bytes_to_data_uri(bio.read(), mime="image/jpeg")
-            pad["lp_logo"] = data_uri
-            await update.message.reply_text(
-                "✅ Image received. Ab **Subheading** bhejein."
-            )
+            # keep the (large) image out of the pad, only a reference in it
+            pad["lp_logo"] = SESSIONS.put_blob(_session_key(update, context), data_uri)
+            if pad.pop("lp_relogo", False):
+                await update.message.reply_text("✅ Image received.")
+                await _ask_lp_niche(update)
+                return STATE_CREATE_LP_NICHE
+            await update.message.reply_text("✅ Image received. " + _lp_sub_prompt())
+            ANALYTICS.record("flow", "lp:logo")
             return STATE_CREATE_LP_SUB
         except Exception as e:
             await update.message.reply_text(
@@ -636,7 +2953,11 @@ async def create_lp_get_logo(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # URL path
     if update.message and update.message.text:
         pad["lp_logo"] = update.message.text.strip()
-        await update.message.reply_text("**Subheading** bhejein.")
+        if pad.pop("lp_relogo", False):
+            await _ask_lp_niche(update)
+            return STATE_CREATE_LP_NICHE
+        await update.message.reply_text(_lp_sub_prompt())
+        ANALYTICS.record("flow", "lp:logo")
         return STATE_CREATE_LP_SUB
     await update.message.reply_text(
         "Please send **image URL** ya **photo upload** karke try karein."
@@ -644,26 +2965,104 @@ async def create_lp_get_logo(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return STATE_CREATE_LP_LOGO
 
 
+def _lp_sub_prompt() -> str:
+    if COPY_GEN.available:
+        return "**Subheading** bhejein — ya `/ai <niche>` se copy generate karwayein."
+    return "**Subheading** bhejein."
+
+
+async def _ask_lp_colors(update: Update):
+    await update.message.reply_text(
+        "**Color theme** JSON bhejein (primary, secondary, accent, light). Example:\n"
+        """```{"primary":"#1d4ed8","secondary":"#15803d","accent":"#000000","light":"#111827"}```""",
+        parse_mode="Markdown",
+    )
+
+
+async def _ask_lp_niche(update: Update):
+    await update.message.reply_text(
+        "Business/Channel **niche** + **CTA link** bhejein. Example: `marketing https://wa.me/918982285510`",
+        parse_mode="Markdown",
+    )
+
+
+@profiled
 async def create_lp_get_sub(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
+    if await _lp_pad_lost(update, pad):
+        return STATE_CREATE_LP_NAME
     pad["lp_sub"] = update.message.text.strip()
     await update.message.reply_text("**Description** bhejein (1–3 lines).")
+    ANALYTICS.record("flow", "lp:sub")
     return STATE_CREATE_LP_DESC
 
 
+@profiled
+async def create_lp_ai_copy(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/ai <niche> — generate heading, subheading, description and keywords."""
+    pad = get_userpad(context)
+    if await _lp_pad_lost(update, pad):
+        return STATE_CREATE_LP_NAME
+    if not COPY_GEN.available:
+        await update.message.reply_text(
+            "AI copy configured nahi hai (GEMINI_API_KEY). **Subheading** bhejein."
+        )
+        return STATE_CREATE_LP_SUB
+    niche = " ".join(context.args or []).strip() or "marketing"
+    title = pad.get("lp_title", "Your Brand")
+    msg = await update.message.reply_text("✨ Generating copy...")
+    last = {"at": 0.0, "text": ""}
+
+    async def on_partial(text: str):
+        now = time.monotonic()
+        if now - last["at"] < AI_EDIT_INTERVAL or text == last["text"]:
+            return
+        last["at"], last["text"] = now, text
+        try:
+            await msg.edit_text(f"✨ Generating copy...\n\n{text[-3500:]}")
+        except Exception:
+            pass
+
+    try:
+        copy = await COPY_GEN.generate(niche, title, on_partial=on_partial)
+    except Exception as e:
+        await msg.edit_text(f"AI copy failed: {e}\n**Subheading** khud bhejein.")
+        return STATE_CREATE_LP_SUB
+
+    pad["lp_niche"] = niche
+    if copy["heading"]:
+        pad["lp_heading"] = copy["heading"]
+    if copy["subheading"]:
+        pad["lp_sub"] = copy["subheading"]
+    if copy["description"]:
+        pad["lp_desc"] = copy["description"]
+    if copy["keywords"]:
+        pad["lp_keywords"] = copy["keywords"]
+    await msg.edit_text(
+        f"✨ {copy['heading'] or title}\n{copy['subheading']}\n\n"
+        f"{copy['description']}\n\nKeywords: {copy['keywords']}"
+    )
+    await _ask_lp_colors(update)
+    ANALYTICS.record("flow", "lp:ai")
+    return STATE_CREATE_LP_COLORS
+
+
+@profiled
 async def create_lp_get_desc(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
+    if await _lp_pad_lost(update, pad):
+        return STATE_CREATE_LP_NAME
     pad["lp_desc"] = update.message.text.strip()
-    await update.message.reply_text(
-        "**Color theme** JSON bhejein (primary, secondary, accent, light). Example:\n"
-        """```{"primary":"#1d4ed8","secondary":"#15803d","accent":"#000000","light":"#111827"}```""",
-        parse_mode="Markdown",
-    )
+    await _ask_lp_colors(update)
+    ANALYTICS.record("flow", "lp:desc")
     return STATE_CREATE_LP_COLORS
 
 
+@profiled
 async def create_lp_get_colors(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
+    if await _lp_pad_lost(update, pad):
+        return STATE_CREATE_LP_NAME
     raw = update.message.text.strip().strip("`")
     try:
         colors = json.loads(raw)
@@ -675,25 +3074,34 @@ async def create_lp_get_colors(update: Update, context: ContextTypes.DEFAULT_TYP
             "light": "#111827",
         }
     pad["lp_colors"] = colors
-    await update.message.reply_text(
-        "Business/Channel **niche** + **CTA link** bhejein. Example: `marketing https://wa.me/918982285510`",
-        parse_mode="Markdown",
-    )
+    await _ask_lp_niche(update)
+    ANALYTICS.record("flow", "lp:colors")
     return STATE_CREATE_LP_NICHE
 
 
+@profiled
 async def create_lp_get_niche(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pad = get_userpad(context)
+    if await _lp_pad_lost(update, pad):
+        return STATE_CREATE_LP_NAME
     txt = update.message.text.strip().split()
-    niche = txt[0] if txt else "marketing"
+    niche = txt[0] if txt else pad.get("lp_niche", "marketing")
     cta = (
         txt[-1]
         if txt and txt[-1].startswith("http")
-        else FOLLOW_LINKS.get("WhatsApp", "https://wa.me/918982285510")
+        else CONFIG.follow_links.get("WhatsApp", "https://wa.me/918982285510")
     )
 
     title = pad.get("lp_title", "Your Brand")
-    logo = pad.get("lp_logo", "logo.jpg")
+    session_key = _session_key(update, context)
+    logo = SESSIONS.resolve(session_key, pad.get("lp_logo", "logo.jpg"))
+    if logo is None:
+        # uploaded logo expired or was lost; ask again, then come back here
+        pad["lp_relogo"] = True
+        await update.message.reply_text(
+            "Uploaded logo expire ho gaya 😕 Logo ka URL ya photo dobara bhejein."
+        )
+        return STATE_CREATE_LP_LOGO
     sub = pad.get("lp_sub", "We build results, not just pages.")
     desc = pad.get("lp_desc", "Done-for-you creative, IT & marketing solutions.")
     colors = pad.get(
@@ -705,11 +3113,14 @@ async def create_lp_get_niche(update: Update, context: ContextTypes.DEFAULT_TYPE
             "light": "#111827",
         },
     )
-    kws = f"{niche}, MetaBull Universe, {title}, services, pricing, contact"
+    heading = pad.get("lp_heading", title)
+    kws = pad.get("lp_keywords") or (
+        f"{niche}, MetaBull Universe, {title}, services, pricing, contact"
+    )
 
     html_code = LP_TEMPLATE.format(
         TITLE=html.escape(title),
-        HEADING=html.escape(title),
+        HEADING=html.escape(heading),
         SUBHEADING=html.escape(sub),
         DESCRIPTION=html.escape(desc),
         KEYWORDS=html.escape(kws),
@@ -726,21 +3137,37 @@ async def create_lp_get_niche(update: Update, context: ContextTypes.DEFAULT_TYPE
     with open(fn, "w", encoding="utf-8") as f:
         f.write(html_code)
 
-    await update.message.reply_document(
-        document=InputFile(fn),
-        filename=fn,
+    await reply_file(
+        update.message,
+        "document",
+        html_code.encode("utf-8"),
+        fn,
         caption="Landing page ready ✅ — HTML attached.",
     )
+    if PAGE_HOST is not None:
+        try:
+            slug = await asyncio.to_thread(PAGE_HOST.publish, title, html_code)
+            url = PAGE_HOST.url_for(slug)
+            if url:
+                await update.message.reply_text(
+                    f"🌍 Live: {url}", disable_web_page_preview=True
+                )
+        except Exception as e:
+            print("[WARN] publish landing page failed:", e)
     await update.message.reply_text(
-        "All set! Edits chahiye to command dubara run kar lo.", reply_markup=MAIN_KB
+        "All set! Edits chahiye to command dubara run kar lo.",
+        reply_markup=CONFIG.main_kb,
     )
     user = f"{update.effective_user.full_name} (@{update.effective_user.username})"
     log_to_google(user, f"[Create LP] niche={niche}, cta={cta}", f"generated {fn}")
     pad.clear()
+    ANALYTICS.record("flow", "lp:done")
+    SESSIONS.drop_blobs(session_key)
     return STATE_IDLE
 
 
 # ----- Service Demos (advanced) -----
+@profiled
 async def service_demos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await open_demos_browser(update, context, page=0, category="All", search="")
     user = f"{update.effective_user.full_name} (@{update.effective_user.username})"
@@ -748,9 +3175,8 @@ async def service_demos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return STATE_IDLE
 
 
-async def demos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # /demos [category?] [search query?]
-    args = context.args
+def _parse_demo_query(args: List[str]) -> Tuple[str, str]:
+    """[category?] [search query?] -> (category, search)"""
     cat = "All"
     search = ""
     if args:
@@ -761,9 +3187,77 @@ async def demos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             search = " ".join(args[1:]) if len(args) > 1 else ""
         else:
             search = " ".join(args)
+    return cat, search
+
+
+@profiled
+async def demos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /demos [category?] [search query?]
+    cat, search = _parse_demo_query(context.args or [])
     await open_demos_browser(update, context, page=0, category=cat, search=search)
 
 
+# ----- Inline mode: @bot [category] [search] -----
+INLINE_PAGE_SIZE = 20  # Telegram allows at most 50 per answer
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+INLINE_CACHE_SIZE = 512
+_INLINE_RESULTS: "OrderedDict[Tuple[int, int, str], List[Any]]" = OrderedDict()
+
+
+def _inline_demo_results(query: str) -> List[Any]:
+    """Articles for a query, cached until the catalog revision changes."""
+    query = " ".join(query.lower().split())
+    DEMO_STORE.load()
+    key = (DEMO_STORE.revision, DEMO_HEALTH.revision, query)
+    hit = _INLINE_RESULTS.get(key)
+    if hit is not None:
+        _INLINE_RESULTS.move_to_end(key)
+        return hit
+    cat, search = _parse_demo_query(query.split())
+    demos = DEMO_STORE.list(
+        category=None if cat == "All" else cat, search=search or None
+    )
+    demos = _visible_demos(demos)
+    results = []
+    for name, url, cat_, _ord in demos:
+        rid = hashlib.sha1(f"{name}\n{url}".encode("utf-8")).hexdigest()
+        results.append(
+            InlineQueryResultArticle(
+                id=rid,
+                title=name,
+                description=f"{cat_} — {url}",
+                url=url,
+                input_message_content=InputTextMessageContent(f"🔗 {name}\n{url}"),
+                reply_markup=InlineKeyboardMarkup(
+                    [[InlineKeyboardButton(f"🔗 {name}", url=url)]]
+                ),
+            )
+        )
+    _INLINE_RESULTS[key] = results
+    if len(_INLINE_RESULTS) > INLINE_CACHE_SIZE:
+        _INLINE_RESULTS.popitem(last=False)
+    return results
+
+
+@profiled
+async def inline_demos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    iq = update.inline_query
+    if not iq:
+        return
+    try:
+        offset = max(0, int(iq.offset or 0))
+    except ValueError:
+        offset = 0
+    results = _inline_demo_results(iq.query or "")
+    end = offset + INLINE_PAGE_SIZE
+    await iq.answer(
+        results[offset:end],
+        cache_time=INLINE_CACHE_TIME,
+        next_offset=str(end) if end < len(results) else "",
+    )
+
+
+@profiled
 async def demos_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle pagination / category / search callback."""
     q = update.callback_query
@@ -827,8 +3321,9 @@ def _parse_adddemo(text: str) -> Optional[Tuple[str, str, str]]:
     return None
 
 
+@profiled
 async def adddemo(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not _is_admin(update):
+    if not _is_admin(update, context):
         await update.message.reply_text(
             "Only admins can add demos. Set ADMIN_USERNAMES env."
         )
@@ -841,12 +3336,13 @@ async def adddemo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     name, url, cat = parsed
-    msg = DEMO_STORE.add(name=name, url=url, category=cat)
+    msg = await asyncio.to_thread(DEMO_STORE.add, name=name, url=url, category=cat)
     await update.message.reply_text(f"{msg}  → *{name}* ({cat})", parse_mode="Markdown")
 
 
+@profiled
 async def removedemo(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not _is_admin(update):
+    if not _is_admin(update, context):
         await update.message.reply_text(
             "Only admins can remove demos. Set ADMIN_USERNAMES env."
         )
@@ -859,12 +3355,13 @@ async def removedemo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     target = name[1].strip()
-    msg = DEMO_STORE.remove(target)
+    msg = await asyncio.to_thread(DEMO_STORE.remove, target)
     await update.message.reply_text(f"{msg}  → *{target}*", parse_mode="Markdown")
 
 
+@profiled
 async def listdemos(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not _is_admin(update):
+    if not _is_admin(update, context):
         await update.message.reply_text(
             "Only admins can list demos. Set ADMIN_USERNAMES env."
         )
@@ -873,25 +3370,101 @@ async def listdemos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not data:
         await update.message.reply_text("No demos.")
         return
-    lines = [f"- *{n}* ({c}) — {u}" for (n, u, c, _o) in data]
+    lines = [f"{_health_label(u)} *{n}* ({c}) — {u}" for (n, u, c, _o) in data]
     await update.message.reply_text(
         "\n".join(lines), parse_mode="Markdown", disable_web_page_preview=True
     )
 
 
+def _health_label(url: str) -> str:
+    st = DEMO_HEALTH.status(url)
+    if not st:
+        return "❔"
+    if st.get("ok"):
+        return "✅"
+    return f"⚠️ ({st.get('status') or st.get('error') or 'down'})"
+
+
+@profiled
+async def checkdemos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update, context):
+        await update.message.reply_text(
+            "Only admins can check demos. Set ADMIN_USERNAMES env."
+        )
+        return
+    msg = await update.message.reply_text("Checking demo links...")
+    urls = [d[1] for d in DEMO_STORE.list()]
+    await DEMO_HEALTH.check_all(urls, force=True)
+    broken = [u for u in urls if DEMO_HEALTH.is_broken(u)]
+    await msg.edit_text(
+        f"Checked {len(urls)} links, {len(broken)} broken. See /listdemos."
+    )
+
+
+@profiled
+async def archivelogs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update, context):
+        await update.message.reply_text(
+            "Only admins can archive logs. Set ADMIN_USERNAMES env."
+        )
+        return
+    paths = await asyncio.wrap_future(_LOG_WRITER.submit(archive_log_partitions))
+    if not paths:
+        await update.message.reply_text("Nothing to archive.")
+        return
+    await update.message.reply_text(
+        "Archived:\n" + "\n".join(f"- {p}" for p in paths)
+    )
+
+
+@profiled
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile start [sample|trace] [seconds] | stop | dump"""
+    if not _is_admin(update, context):
+        await update.message.reply_text(
+            "Only admins can profile. Set ADMIN_USERNAMES env."
+        )
+        return
+    args = [a.lower() for a in (context.args or [])]
+    action = args[0] if args else ""
+    if action == "start":
+        mode = args[1] if len(args) > 1 else "sample"
+        try:
+            seconds = float(args[2]) if len(args) > 2 else 0
+        except ValueError:
+            seconds = 0
+        await update.message.reply_text(PROFILER.start(mode, seconds))
+    elif action == "stop":
+        await update.message.reply_text(PROFILER.stop() + "\n\n" + PROFILER.summary())
+    elif action == "dump":
+        path = PROFILER.dump()
+        summary = PROFILER.summary()
+        if not path:
+            await update.message.reply_text("No profile data.\n\n" + summary)
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        await reply_file(
+            update.message,
+            "document",
+            data,
+            os.path.basename(path),
+            caption=summary[:1000],
+        )
+    else:
+        state = f"running ({PROFILER.mode})" if PROFILER.active else "off"
+        await update.message.reply_text(
+            f"Profiler: {state}\nUsage: `/profile start [sample|trace] [seconds]`, "
+            "`/profile stop`, `/profile dump`",
+            parse_mode="Markdown",
+        )
+
+
 # ----- Follow Us -----
+@profiled
 async def follow_us(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    rows, row = [], []
-    for name, url in FOLLOW_LINKS.items():
-        row.append(InlineKeyboardButton(f"⭐ {name}", url=url))
-        if len(row) == 2:
-            rows.append(row)
-            row = []
-    if row:
-        rows.append(row)
-    kb = InlineKeyboardMarkup(rows)
     await update.message.reply_text(
-        "🌟 **Follow Us**", reply_markup=kb, parse_mode="Markdown"
+        "🌟 **Follow Us**", reply_markup=CONFIG.follow_kb, parse_mode="Markdown"
     )
     user = f"{update.effective_user.full_name} (@{update.effective_user.username})"
     log_to_google(user, "Follow Us opened", "Links shown")
@@ -899,8 +3472,21 @@ async def follow_us(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ----- Bottom router -----
+MENU_LABELS = {
+    "🔄 Start",
+    "🖼️ Create a Post",
+    "🌐 Create a Landing Page",
+    "🧪 Service Demos",
+    "🌟 Follow Us",
+    "⛔ Cancel",
+}
+
+
+@profiled
 async def bottom_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
     txt = (update.message.text or "").strip()
+    if txt in MENU_LABELS:
+        ANALYTICS.record("menu", txt)
     if txt == "🔄 Start":
         return await start(update, context)
     if txt == "🖼️ Create a Post":
@@ -916,7 +3502,7 @@ async def bottom_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # default nudge
     await update.message.reply_text(
-        "Choose an option from the keyboard below 🙂", reply_markup=MAIN_KB
+        "Choose an option from the keyboard below 🙂", reply_markup=CONFIG.main_kb
     )
     user = f"{update.effective_user.full_name} (@{update.effective_user.username})"
     from_text = txt if txt else "[non-text]"
@@ -925,6 +3511,7 @@ async def bottom_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ----- Raw logger (optional) -----
+@profiled
 async def log_all_incoming(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user = f"{update.effective_user.full_name} (@{update.effective_user.username})"
@@ -938,9 +3525,249 @@ async def log_all_incoming(update: Update, context: ContextTypes.DEFAULT_TYPE):
         pass
 
 
+@profiled
+async def memory_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update, context):
+        await update.message.reply_text(
+            "Only admins can view memory. Set ADMIN_USERNAMES env."
+        )
+        return
+    r = SESSIONS.report()
+    lines = [
+        f"Sessions: {r['sessions']}",
+        f"Total: {r['total_bytes'] / 1024:.1f} KiB / cap {r['cap_bytes'] / 1024:.0f} KiB",
+        f"Evicted: {r['evictions']}",
+    ]
+    for (_bot_id, user_id), size in r["top"]:
+        lines.append(f"- {user_id}: {size / 1024:.1f} KiB")
+    await update.message.reply_text("\n".join(lines))
+
+
+@profiled
+async def google_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update, context):
+        await update.message.reply_text(
+            "Only admins can view Google status. Set ADMIN_USERNAMES env."
+        )
+        return
+    rows = GOOGLE_GUARD.report()
+    if not rows:
+        await update.message.reply_text("No Google calls yet.")
+        return
+    lines = []
+    for r in rows:
+        lines.append(
+            f"{r['service']}: {r['state']} | calls {r.get('calls', 0)}, "
+            f"failures {r.get('failures', 0)}, retries {r.get('retries', 0)}, "
+            f"fast-failed {r.get('rejected', 0)}, opened {r.get('opened', 0)}"
+        )
+        if r["last_error"]:
+            lines.append(f"  last error: {r['last_error']}")
+    await update.message.reply_text("\n".join(lines))
+
+
+# ----- Analytics -----
+LP_FUNNEL = [
+    ("started", ("lp:start",)),
+    ("name", ("lp:name",)),
+    ("logo", ("lp:logo",)),
+    ("copy", ("lp:desc", "lp:ai")),  # manual sub+desc, or /ai
+    ("colors", ("lp:colors",)),
+    ("completed", ("lp:done",)),
+]
+POST_FUNNEL = [
+    ("started", ("post:start",)),
+    ("image", ("post:image",)),
+    ("completed", ("post:done",)),
+]
+
+
+def _top(counts: Counter, metric: str, n: int = 5) -> List[Tuple[str, int]]:
+    prefix = metric + "|"
+    rows = [(k[len(prefix) :], v) for k, v in counts.items() if k.startswith(prefix)]
+    return heapq.nlargest(n, rows, key=lambda r: r[1])
+
+
+def _funnel_lines(
+    counts: Counter, steps: List[Tuple[str, Tuple[str, ...]]]
+) -> List[str]:
+    lines = []
+    first = prev = None
+    for label, keys in steps:
+        n = sum(counts.get(f"flow|{k}", 0) for k in keys)
+        if first is None:
+            first = n
+            lines.append(f"  {label}: {n}")
+        else:
+            drop = f", -{prev - n}" if prev and n < prev else ""
+            pct = f" ({100 * n / first:.0f}%{drop})" if first else ""
+            lines.append(f"  {label}: {n}{pct}")
+        prev = n
+    return lines
+
+
+def format_analytics(counts: Counter, period: str) -> str:
+    lines = [f"📊 Analytics ({period})", "", "Menu:"]
+    lines += [f"  {k}: {v}" for k, v in _top(counts, "menu", 10)] or ["  -"]
+    lines += ["", "Landing page funnel:"] + _funnel_lines(counts, LP_FUNNEL)
+    lines += ["", "Post funnel:"] + _funnel_lines(counts, POST_FUNNEL)
+    lines += ["", "Post CTA types:"]
+    lines += [f"  {k}: {v}" for k, v in _top(counts, "post_cta")] or ["  -"]
+    lines += ["", "Top demo categories:"]
+    lines += [f"  {k}: {v}" for k, v in _top(counts, "demo_category")] or ["  -"]
+    lines += ["", "Top demo searches:"]
+    lines += [f"  {k}: {v}" for k, v in _top(counts, "demo_search")] or ["  -"]
+    return "\n".join(lines)
+
+
+@profiled
+async def analytics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/analytics [days|all]  (default 7 days)"""
+    if not _is_admin(update, context):
+        await update.message.reply_text(
+            "Only admins can view analytics. Set ADMIN_USERNAMES env."
+        )
+        return
+    arg = (context.args or ["7"])[0].lower()
+    if arg == "all":
+        days, period = 0, "all time"
+    else:
+        try:
+            days = max(1, min(int(arg), ANALYTICS_KEEP_DAYS))
+        except ValueError:
+            await update.message.reply_text("Usage: /analytics [days|all]")
+            return
+        period = "today" if days == 1 else f"last {days} days"
+    counts = await asyncio.to_thread(ANALYTICS.query, days)
+    await update.message.reply_text(format_analytics(counts, period))
+
+
+# ----- Config reload -----
+def reload_config() -> str:
+    """Re-read CONFIG_FILE and swap in a new snapshot; keeps the old one on error."""
+    global CONFIG, _CONFIG_MTIME
+    _CONFIG_MTIME = _config_mtime()
+    try:
+        new = build_config(_read_config_file(CONFIG_FILE))
+    except Exception as e:
+        print("[WARN] config reload failed:", e)
+        return f"Config reload failed, keeping current config: {e}"
+    old, CONFIG = CONFIG, new
+    if (old.gsheet_id, old.gdrive_doc_id) != (new.gsheet_id, new.gdrive_doc_id):
+        _LOG_WRITER.submit(_switch_google)
+    print("[INFO] config reloaded")
+    return (
+        f"Config reloaded: {len(new.admin_usernames)} admins, "
+        f"{len(new.follow_links)} follow links, page size {new.demos_page_size}."
+    )
+
+
+def _switch_google():
+    """Point logging and demos at the new sheet/doc (runs on _LOG_WRITER)."""
+    DOCS_TRANSCRIPT.flush()
+    _LOG_PARTITIONS.clear()
+    _try_init_google()
+    DEMO_STORE._loaded = False  # re-read demos from the new sheet
+
+
+async def _config_watch_loop():
+    while True:
+        await asyncio.sleep(CONFIG_WATCH_SECS)
+        if _config_mtime() != _CONFIG_MTIME:
+            reload_config()
+
+
+@profiled
+async def reloadconfig(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update, context):
+        await update.message.reply_text(
+            "Only admins can reload config. Set ADMIN_USERNAMES env."
+        )
+        return
+    await update.message.reply_text(reload_config())
+
+
 # ---------------- App ----------------
-def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+_BACKGROUND_TASKS: List[asyncio.Task] = []
+_BACKGROUND_APPS: List[Any] = []  # apps whose post_init ran
+
+
+async def _post_init(app):
+    """Start process-wide background jobs once, even with several bots."""
+    _BACKGROUND_APPS.append(app)
+    if len(_BACKGROUND_APPS) > 1:
+        return
+    loop = asyncio.get_running_loop()
+    if DEMO_HEALTH_INTERVAL > 0:
+        _BACKGROUND_TASKS.append(loop.create_task(_demo_health_loop()))
+    if CONFIG_WATCH_SECS > 0:
+        _BACKGROUND_TASKS.append(loop.create_task(_config_watch_loop()))
+    if ANALYTICS_FLUSH_SECS > 0:
+        _BACKGROUND_TASKS.append(loop.create_task(_analytics_flush_loop()))
+    if DOC_FLUSH_SECS > 0:
+        _BACKGROUND_TASKS.append(loop.create_task(_docs_flush_loop()))
+    if LOG_ARCHIVE_CHECK_SECS > 0:
+        _BACKGROUND_TASKS.append(loop.create_task(_log_archive_loop()))
+    if PAGE_HOST is not None:
+        await PAGE_HOST.start()
+    if hasattr(signal, "SIGHUP"):
+        try:
+            loop.add_signal_handler(signal.SIGHUP, reload_config)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+
+async def _post_shutdown(app):
+    if app in _BACKGROUND_APPS:
+        _BACKGROUND_APPS.remove(app)
+    if _BACKGROUND_APPS:
+        return  # other bots still running
+    while _BACKGROUND_TASKS:
+        _BACKGROUND_TASKS.pop().cancel()
+    if PAGE_HOST is not None:
+        await PAGE_HOST.stop()
+    # drain queued log writes and the transcript buffer now: at interpreter
+    # exit the Google pools no longer accept work, so atexit is too late
+    await asyncio.wrap_future(_LOG_WRITER.submit(DOCS_TRANSCRIPT.flush))
+
+
+def _bot_configs() -> List[Dict[str, Any]]:
+    """BOT_TOKEN, plus BOT_TOKEN1..N when MULTI_BOT is on.
+
+    Each extra bot may set BOT_NAME<n> and ADMIN_USERNAMES<n>; everything
+    else (demo store, Google clients, logging, AI cache) is shared.
+    """
+    configs = [
+        {"name": os.getenv("BOT_NAME", "main"), "token": BOT_TOKEN, "admins": None}
+    ]
+    if not MULTI_BOT:
+        return configs
+    n = 1
+    while os.getenv(f"BOT_TOKEN{n}", "").strip():
+        configs.append(
+            {
+                "name": os.getenv(f"BOT_NAME{n}", f"bot{n}"),
+                "token": os.getenv(f"BOT_TOKEN{n}").strip(),
+                "admins": _parse_admins(os.getenv(f"ADMIN_USERNAMES{n}", "")) or None,
+            }
+        )
+        n += 1
+    return configs
+
+
+def build_app(config: Dict[str, Any]):
+    builder = (
+        ApplicationBuilder()
+        .token(config["token"])
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+    )
+    if SHARED_KV is not None:
+        builder = builder.persistence(
+            KVPersistence(SHARED_KV, config["name"], STATE_FLUSH_SECS)
+        )
+    app = builder.build()
+    app.bot_data["config"] = config
 
     # conversation
     conv = ConversationHandler(
@@ -978,6 +3805,7 @@ def main():
             ],
             STATE_CREATE_LP_SUB: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, create_lp_get_sub),
+                CommandHandler("ai", create_lp_ai_copy),
                 CommandHandler("cancel", cancel),
             ],
             STATE_CREATE_LP_DESC: [
@@ -992,11 +3820,25 @@ def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND, create_lp_get_niche),
                 CommandHandler("cancel", cancel),
             ],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, conversation_timeout)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
         allow_reentry=True,
+        conversation_timeout=SESSION_IDLE_SECS or None,
+        name="main",
+        persistent=SHARED_KV is not None,
     )
 
+    if SHARED_KV is not None:
+        # other workers may have moved the conversation on; sync before
+        # anything else and write back as soon as the update is handled
+        app.bot_data["conversation"] = conv
+        app.add_handler(TypeHandler(Update, _sync_conversation), group=-2)
+        app.add_handler(TypeHandler(Update, _flush_persistence), group=2)
+
+    # session accounting before anything else
+    app.add_handler(TypeHandler(Update, _touch_session), group=-1)
+
     # global logger
     app.add_handler(
         MessageHandler(filters.ALL & ~filters.COMMAND, log_all_incoming), group=1
@@ -1005,14 +3847,88 @@ def main():
     # demos handlers
     app.add_handler(CommandHandler("demos", demos_command))
     app.add_handler(CallbackQueryHandler(demos_callback, pattern=r"^DEMOS:"))
+    app.add_handler(InlineQueryHandler(inline_demos))
     app.add_handler(CommandHandler("adddemo", adddemo))
     app.add_handler(CommandHandler("removedemo", removedemo))
     app.add_handler(CommandHandler("listdemos", listdemos))
+    app.add_handler(CommandHandler("checkdemos", checkdemos))
+    app.add_handler(CommandHandler("archivelogs", archivelogs))
+    app.add_handler(CommandHandler("profile", profile_command))
+    app.add_handler(CommandHandler("reloadconfig", reloadconfig))
+    app.add_handler(CommandHandler("memory", memory_command))
+    app.add_handler(CommandHandler("analytics", analytics_command))
+    app.add_handler(CommandHandler("google", google_status))
 
     app.add_handler(conv)
+    # text outside any conversation (e.g. after the idle timeout) still gets
+    # the menu nudge; conv comes first, so flow steps are never taken over
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bottom_router))
+    return app
+
+
+async def run_bots(apps: List[Any]):
+    """Poll several Applications on one event loop until SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # e.g. Windows; Ctrl+C still raises KeyboardInterrupt
+    started = []
+    try:
+        for i, app in enumerate(apps):
+            await app.initialize()
+            # only run_polling/run_webhook call post_init; do it by hand here
+            await _post_init(app)
+            started.append(app)
+            await app.start()
+            if WEBHOOK_URL:
+                # one port per bot; route each bot's path to its port
+                path = app.bot_data["config"]["name"]
+                await app.updater.start_webhook(
+                    listen="0.0.0.0",
+                    port=WEBHOOK_PORT + i,
+                    url_path=path,
+                    webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{path}",
+                )
+            else:
+                await app.updater.start_polling()
+        await stop.wait()
+    finally:
+        for app in reversed(started):
+            try:
+                if app.updater.running:
+                    await app.updater.stop()
+                if app.running:
+                    await app.stop()
+                await app.shutdown()
+            except Exception as e:
+                print("[WARN] bot shutdown issue:", e)
+            await _post_shutdown(app)
+
 
-    print("Bot running...")
-    app.run_polling()
+def main():
+    if PROFILE_MODE:
+        print(PROFILER.start(PROFILE_MODE))
+    configs = _bot_configs()
+    if len(configs) == 1:
+        app = build_app(configs[0])
+        print("Bot running...")
+        if WEBHOOK_URL:
+            path = configs[0]["name"]
+            app.run_webhook(
+                listen="0.0.0.0",
+                port=WEBHOOK_PORT,
+                url_path=path,
+                webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{path}",
+            )
+        else:
+            app.run_polling()
+        return
+    apps = [build_app(c) for c in configs]
+    print(f"{len(apps)} bots running:", ", ".join(c["name"] for c in configs))
+    asyncio.run(run_bots(apps))
 
 
 if __name__ == "__main__":
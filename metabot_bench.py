@@ -0,0 +1,185 @@
+"""Local benchmarks for metabot's hot paths.
+
+    python metabot_bench.py search [entries]
+    python metabot_bench.py pages [connections] [requests per connection]
+
+Runs without Telegram or Google: a placeholder BOT_TOKEN is set and shared
+state is kept in memory.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+import statistics
+import multiprocessing
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+os.environ.setdefault("STATE_BACKEND", "memory:")
+os.environ.setdefault("GOOGLE_SERVICE_ACCOUNT_JSON", "")
+
+import metabot  # noqa: E402
+
+WORDS = (
+    "website landing page shop store portfolio agency studio marketing seo "
+    "social media video youtube playlist reel logo brand design restaurant "
+    "salon gym clinic dental school coaching realestate hotel travel fashion "
+    "jewellery bakery cafe wedding photography app dashboard crm invoice"
+).split()
+CATEGORIES = [f"{w.title()}s" for w in WORDS[:20]]
+CONSONANTS, VOWELS = "bcdfghjklmnprstvwz", "aeiou"
+
+
+def _vocabulary(size: int = 2000, seed: int = 3):
+    """Real service words plus brand-like pseudo-words, as demo names mix both."""
+    rnd = random.Random(seed)
+    words = set(WORDS)
+    while len(words) < size:
+        length = rnd.randint(4, 9)
+        words.add(
+            "".join(rnd.choice(VOWELS if i % 2 else CONSONANTS) for i in range(length))
+        )
+    return sorted(words)
+
+
+VOCABULARY = _vocabulary()
+
+
+def _catalog(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    return [
+        (
+            " ".join(rnd.sample(VOCABULARY, 3)).title() + f" {i}",
+            f"https://example.com/{i}",
+            rnd.choice(CATEGORIES),
+            rnd.randint(0, 100),
+        )
+        for i in range(n)
+    ]
+
+
+def _typo(word: str, rnd: random.Random) -> str:
+    i = rnd.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+
+
+def _timed(fn, queries):
+    times = []
+    for q in queries:
+        t = time.perf_counter()
+        fn(q)
+        times.append((time.perf_counter() - t) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99) - 1], times[-1]
+
+
+def bench_search(n: int = 10_000):
+    rnd = random.Random(1)
+    entries = _catalog(n)
+    t = time.perf_counter()
+    index = metabot.DemoSearchIndex(entries)
+    print(f"index build, {n} entries: {(time.perf_counter() - t) * 1000:.1f} ms")
+
+    kinds = {
+        "word": [rnd.choice(VOCABULARY) for _ in range(200)],
+        "two words": [" ".join(rnd.sample(VOCABULARY, 2)) for _ in range(200)],
+        "typo": [_typo(rnd.choice(VOCABULARY), rnd) for _ in range(200)],
+        "2 chars": [w[1:3] for w in rnd.sample(WORDS, 20)],
+        "category": [c.lower() for c in CATEGORIES],
+        "no hit": [f"zq{i}x" for i in range(200)],
+    }
+    print(
+        f"{'query':<10} {'results':>8} {'uncached median/p99/max (ms)':>30}"
+        f" {'cached (us)':>12}"
+    )
+    for name, queries in kinds.items():
+        # _rank bypasses the per-query cache, search() hits it after one call
+        med, p99, worst = _timed(index._rank, queries)
+        hits = statistics.median(len(index.search(q)) for q in queries)
+        cached, _p99, _worst = _timed(index.search, queries)
+        print(
+            f"{name:<10} {hits:>8.0f} {med:>12.3f} / {p99:.3f} / {worst:.3f}"
+            f" {cached * 1000:>12.2f}"
+        )
+
+
+async def _load(port: int, slug: str, conns: int, per_conn: int) -> int:
+    """Keep-alive GETs over `conns` connections; returns 200 responses seen."""
+    request = (
+        f"GET /{slug} HTTP/1.1\r\nHost: localhost\r\n"
+        "Accept-Encoding: gzip, br\r\n\r\n"
+    ).encode()
+
+    async def client() -> int:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        ok = 0
+        for _ in range(per_conn):
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            ok += head.startswith(b"HTTP/1.1 200")
+        writer.close()
+        return ok
+
+    return sum(await asyncio.gather(*(client() for _ in range(conns))))
+
+
+def _load_process(port: int, slug: str, conns: int, per_conn: int, out):
+    t = time.perf_counter()
+    ok = asyncio.run(_load(port, slug, conns, per_conn))
+    out.put((ok, time.perf_counter() - t))
+
+
+async def _serve_pages(conns: int, per_conn: int):
+    with tempfile.TemporaryDirectory() as root:
+        host = metabot.PageHost(root, 32 * 1024 * 1024)
+        html_text = metabot.LP_TEMPLATE.format(
+            TITLE="Bench",
+            HEADING="Bench page",
+            SUBHEADING="We build results, not just pages.",
+            DESCRIPTION="Done-for-you creative, IT & marketing solutions. " * 10,
+            KEYWORDS="bench",
+            LOGO_URL="logo.jpg",
+            PRIMARY="#1d4ed8",
+            SECONDARY="#15803d",
+            ACCENT="#000000",
+            LIGHT="#111827",
+            CTA_LINK="https://wa.me/0",
+        )
+        slug = host.publish("bench", html_text)
+        server = await asyncio.start_server(host.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        out = multiprocessing.Queue()
+        proc = multiprocessing.Process(
+            target=_load_process, args=(port, slug, conns, per_conn, out)
+        )
+        proc.start()
+        ok, elapsed = await asyncio.to_thread(out.get)
+        proc.join()
+        server.close()
+        await server.wait_closed()
+    size = len(html_text.encode("utf-8"))
+    print(
+        f"{conns} keep-alive connections x {per_conn} GETs of a {size} B page"
+        f" (load generator in a separate process)"
+    )
+    print(f"{ok} x 200 in {elapsed:.2f} s: {ok / elapsed:,.0f} req/s")
+
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == "search":
+        bench_search(int(args[1]) if len(args) > 1 else 10_000)
+    elif args and args[0] == "pages":
+        conns = int(args[1]) if len(args) > 1 else 50
+        per_conn = int(args[2]) if len(args) > 2 else 400
+        asyncio.run(_serve_pages(conns, per_conn))
+    else:
+        raise SystemExit(__doc__)
+
+
+if __name__ == "__main__":
+    main()
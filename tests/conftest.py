@@ -0,0 +1,13 @@
+import os
+import sys
+
+# metabot reads its config at import; keep tests off Telegram, Google,
+# Gemini and the on-disk state store (set before load_dotenv runs)
+os.environ["BOT_TOKEN"] = "0:test"
+os.environ["STATE_BACKEND"] = "memory:"
+os.environ["GOOGLE_SERVICE_ACCOUNT_JSON"] = ""
+os.environ["GEMINI_API_KEY"] = ""
+os.environ["LP_HOST_PORT"] = "0"
+os.environ["MULTI_BOT"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,182 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import metabot
+
+COPY = {
+    "heading": "Grow faster",
+    "subheading": "Marketing that ships",
+    "description": "Done-for-you campaigns.",
+    "keywords": "seo, ads",
+}
+
+
+class StubModel:
+    """Stands in for GenerativeModel: streams COPY in two chunks."""
+
+    def __init__(self, delay: float = 0.05, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=True):
+        self.calls += 1
+        text = json.dumps(COPY)
+
+        async def chunks():
+            await asyncio.sleep(self.delay)
+            if self.error is not None:
+                raise self.error
+            yield SimpleNamespace(text=text[:10])
+            yield SimpleNamespace(text=text[10:])
+
+        return chunks()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_streams_partials_and_parses_copy():
+    model = StubModel()
+    partials = []
+
+    async def on_partial(text):
+        partials.append(text)
+
+    async def main():
+        gen = metabot.CopyGenerator(model)
+        return await gen.generate("seo", "Acme", on_partial=on_partial)
+
+    assert run(main()) == COPY
+    assert partials[-1] == json.dumps(COPY)
+
+
+def test_cache_hit_skips_the_model():
+    model = StubModel()
+
+    async def main():
+        gen = metabot.CopyGenerator(model)
+        first = await gen.generate("seo", "Acme")
+        # same prompt after whitespace/case normalization
+        second = await gen.generate("  SEO ", "acme")
+        return first, second
+
+    first, second = run(main())
+    assert first == second == COPY
+    assert model.calls == 1
+
+
+def test_expired_entry_calls_the_model_again():
+    model = StubModel(delay=0)
+
+    async def main():
+        gen = metabot.CopyGenerator(model, ttl=0)
+        await gen.generate("seo", "Acme")
+        await gen.generate("seo", "Acme")
+
+    run(main())
+    assert model.calls == 2
+
+
+def test_lru_evicts_the_oldest_prompt():
+    model = StubModel(delay=0)
+
+    async def main():
+        gen = metabot.CopyGenerator(model, max_entries=1)
+        await gen.generate("seo", "Acme")
+        await gen.generate("ads", "Acme")
+        await gen.generate("seo", "Acme")
+
+    run(main())
+    assert model.calls == 3
+
+
+def test_identical_inflight_prompts_share_one_call():
+    model = StubModel()
+
+    async def main():
+        gen = metabot.CopyGenerator(model)
+        return await asyncio.gather(*(gen.generate("seo", "Acme") for _ in range(5)))
+
+    assert run(main()) == [COPY] * 5
+    assert model.calls == 1
+
+
+def test_error_reaches_followers_and_is_not_cached():
+    model = StubModel(error=RuntimeError("quota"))
+
+    async def main():
+        gen = metabot.CopyGenerator(model)
+        results = await asyncio.gather(
+            gen.generate("seo", "Acme"),
+            gen.generate("seo", "Acme"),
+            return_exceptions=True,
+        )
+        model.error = None
+        return results, await gen.generate("seo", "Acme")
+
+    results, retry = run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert retry == COPY
+    assert model.calls == 2
+
+
+def test_follower_retries_when_the_leader_is_cancelled():
+    model = StubModel(delay=0.1)
+
+    async def main():
+        gen = metabot.CopyGenerator(model)
+        leader = asyncio.create_task(gen.generate("seo", "Acme"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(gen.generate("seo", "Acme"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert run(main()) == COPY
+    assert model.calls == 2
+
+
+def test_cancelled_follower_does_not_cancel_the_shared_call():
+    model = StubModel(delay=0.1)
+
+    async def main():
+        gen = metabot.CopyGenerator(model)
+        leader = asyncio.create_task(gen.generate("seo", "Acme"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(gen.generate("seo", "Acme"))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert run(main()) == COPY
+    assert model.calls == 1
+
+
+def test_concurrency_cap():
+    active = {"now": 0, "max": 0}
+
+    class SlowModel(StubModel):
+        async def generate_content_async(self, prompt, stream=True):
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            try:
+                await asyncio.sleep(0.02)
+            finally:
+                active["now"] -= 1
+            return await super().generate_content_async(prompt, stream)
+
+    async def main():
+        gen = metabot.CopyGenerator(SlowModel(delay=0), max_concurrency=2)
+        await asyncio.gather(*(gen.generate(f"niche{i}", "Acme") for i in range(6)))
+
+    run(main())
+    assert active["max"] == 2
@@ -0,0 +1,144 @@
+import asyncio
+from collections import Counter
+
+import httpx
+
+import metabot
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def mock_client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_head_failure_falls_back_to_get():
+    # (HEAD status, GET status) per path
+    routes = {
+        "/head-ok": (200, 200),
+        "/head-refused": (405, 200),
+        "/get-only": (500, 200),
+        "/gone": (404, 404),
+        "/bot-wall": (403, 403),
+    }
+    seen = Counter()
+
+    def handler(request):
+        head, get = routes[request.url.path]
+        seen[request.method, request.url.path] += 1
+        return httpx.Response(head if request.method == "HEAD" else get)
+
+    checker = metabot.DemoHealthChecker(metabot.MemoryKV())
+    urls = [f"https://demo.test{path}" for path in routes]
+
+    async def main():
+        async with mock_client(handler) as client:
+            return await checker.check_all(urls, client=client)
+
+    assert run(main()) == len(urls)
+    assert seen["GET", "/head-ok"] == 0
+    assert seen["GET", "/head-refused"] == 1
+    assert checker.status("https://demo.test/get-only")["status"] == 200
+    assert not checker.is_broken("https://demo.test/head-refused")
+    assert not checker.is_broken("https://demo.test/bot-wall")  # soft fail
+    assert checker.is_broken("https://demo.test/gone")
+
+
+def test_transport_error_marks_link_broken():
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    checker = metabot.DemoHealthChecker()
+
+    async def main():
+        async with mock_client(handler) as client:
+            await checker.check_all(["https://down.test/"], client=client)
+
+    run(main())
+    st = checker.status("https://down.test/")
+    assert st["ok"] is False
+    assert st["error"] == "ConnectError"
+
+
+def test_per_host_and_global_limits(monkeypatch):
+    monkeypatch.setattr(metabot, "DEMO_HEALTH_PER_HOST", 2)
+    monkeypatch.setattr(metabot, "DEMO_HEALTH_CONCURRENCY", 3)
+    active = Counter()
+    peak = Counter()
+    started = []
+
+    async def handler(request):
+        host = request.url.host
+        started.append(host)
+        active[host] += 1
+        active["*"] += 1
+        peak[host] = max(peak[host], active[host])
+        peak["*"] = max(peak["*"], active["*"])
+        await asyncio.sleep(0.02)
+        active[host] -= 1
+        active["*"] -= 1
+        return httpx.Response(200)
+
+    urls = [f"https://{host}.test/{i}" for host in ("a", "b", "c") for i in range(6)]
+    checker = metabot.DemoHealthChecker()
+
+    async def main():
+        async with mock_client(handler) as client:
+            await checker.check_all(urls, client=client)
+
+    run(main())
+    assert max(peak[h] for h in ("a.test", "b.test", "c.test")) == 2
+    assert peak["*"] == 3
+    # URLs queued behind a busy host don't hold global slots meanwhile
+    third_a = [i for i, h in enumerate(started) if h == "a.test"][2]
+    assert started.index("b.test") < third_a
+
+
+def test_results_are_reused_until_the_ttl(monkeypatch):
+    calls = Counter()
+
+    def handler(request):
+        calls[request.url.path] += 1
+        return httpx.Response(200)
+
+    kv = metabot.MemoryKV()
+    urls = ["https://demo.test/1", "https://demo.test/2"]
+
+    async def check(checker, **kwargs):
+        async with mock_client(handler) as client:
+            return await checker.check_all(urls, client=client, **kwargs)
+
+    checker = metabot.DemoHealthChecker(kv)
+    assert run(check(checker)) == 2
+    assert run(check(checker)) == 0
+    # another worker sharing the store reuses the results too
+    assert run(check(metabot.DemoHealthChecker(kv))) == 0
+    assert run(check(checker, force=True)) == 2
+
+    monkeypatch.setattr(metabot, "DEMO_HEALTH_TTL", 0)
+    assert run(check(checker)) == 2
+    assert calls["/1"] == 3
+
+
+def test_revision_changes_only_when_a_link_flips():
+    status = {"code": 200}
+
+    def handler(request):
+        return httpx.Response(status["code"])
+
+    checker = metabot.DemoHealthChecker()
+    url = "https://demo.test/"
+
+    async def check():
+        async with mock_client(handler) as client:
+            await checker.check_all([url], force=True, client=client)
+
+    run(check())
+    first = checker.revision
+    run(check())
+    assert checker.revision == first
+    status["code"] = 404
+    run(check())
+    assert checker.revision == first + 1